@@ -1,17 +1,33 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import torch
+from typing import Dict, List, Optional
+import numpy as np
 from pathlib import Path
 import sys
+import os
+import time
+import hmac
+import json
 import base64
 import io
+import asyncio
 from PIL import Image
 
 # Add models to path
 sys.path.append(str(Path(__file__).parent))
-from models.classifiers import CNNTextClassifier
 from scripts.prepare_data import TextPreprocessor
+from scripts.bucketing import predict_proba_bucketed, trim_padding
+from serving.backends import backend_artifact, load_backend, softmax
+from serving.batching import MicroBatcher
+from serving.executor import InferenceExecutor, QueueFullError
+from serving.cache import PredictionCache, SqlitePredictionCache, artifact_fingerprint, artifact_hash, sequence_key
+from serving.registry import ModelEntry, ModelRegistry
+from serving.lexicon import LexiconAnalyzer, LexiconCascade
+from serving.metrics import MetricsRegistry, InstrumentedBackend
+from serving.profiling import ProfileCapture
+from serving.documents import segment_document, segment_weights, aggregate
 
 app = FastAPI(title="Emotion Classification API")
 
@@ -24,68 +40,826 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load text model on startup
-device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
+# Load text models on startup
 preprocessor = None
-model = None
+registry = None
+batchers = {}
+executor = None
+profile_capture = None
+stream_model = None
+stream_model_lock = None
+cascade = None
+
+PREPROCESSOR_PATH = Path(__file__).parent / "data" / "processed" / "preprocessor.pkl"
+
+# Micro-batching window for concurrent /predict calls
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 5))
+PREDICT_BATCH_MAX_TEXTS = int(os.environ.get("PREDICT_BATCH_MAX_TEXTS", 1024))
+
+# /predict_file reads uploads in chunks of this many bytes and scores this many lines per batch;
+# lines longer than the limit are reported as errors, so memory stays bounded
+PREDICT_FILE_CHUNK_BYTES = int(os.environ.get("PREDICT_FILE_CHUNK_BYTES", 64 * 1024))
+PREDICT_FILE_BATCH_SIZE = int(os.environ.get("PREDICT_FILE_BATCH_SIZE", 256))
+PREDICT_FILE_MAX_LINE_BYTES = int(os.environ.get("PREDICT_FILE_MAX_LINE_BYTES", 1024 * 1024))
+
+# /predict_document cuts long texts into at most this many segments (all scored in one forward pass)
+PREDICT_DOCUMENT_MAX_SEGMENTS = int(os.environ.get("PREDICT_DOCUMENT_MAX_SEGMENTS", 1024))
+
+# Models loaded side by side and selected per request with "model"; DEFAULT_MODEL when omitted
+MODELS = [name.strip() for name in os.environ.get("MODELS", "cnn,lstm").split(",") if name.strip()]
+DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL", "cnn")
+# Seconds between checks of exports/ for new or rewritten artifacts (0 disables hot reload)
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 5))
+
+# "torch" serves exports/*.pth, "onnx" serves exports/*.onnx without importing torch,
+# "torchscript" serves the fused, frozen CNN graph from scripts/export_torchscript.py
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "torch")
+# Serve the int8 model from scripts/quantize.py (torch backend, CPU only)
+MODEL_QUANTIZED = os.environ.get("MODEL_QUANTIZED", "0") == "1"
+
+# Inference runs in its own thread pool; requests beyond the queue get a 429.
+# Defaults to the backend's thread count when unset.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", 256))
+# Intra-op threads of each forward pass (0: the backend's default, all cores). /predict_ensemble
+# runs its models on separate pool threads, so e.g. 8 cores serve two models best with
+# MODEL_THREADS=4 and INFERENCE_WORKERS=2
+MODEL_THREADS = int(os.environ.get("MODEL_THREADS", 0))
+
+# Models averaged by /predict_ensemble when the request doesn't list them
+ENSEMBLE_MODELS = [name.strip() for name in os.environ.get("ENSEMBLE_MODELS", "cnn,lstm").split(",") if name.strip()]
+
+# LRU cache of predictions keyed on the encoded token sequence (0 disables it)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 10000))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", 3600))
+# "memory" (per process) or "sqlite" (one WAL database shared by all workers on the host)
+PREDICTION_CACHE_BACKEND = os.environ.get("PREDICTION_CACHE_BACKEND", "memory")
+PREDICTION_CACHE_PATH = os.environ.get(
+    "PREDICTION_CACHE_PATH", str(Path(__file__).parent / "data" / "cache" / "predictions.db")
+)
+
+# Lexicon cascade for /predict: texts with at least CASCADE_MIN_EVIDENCE points of rule evidence
+# (a pattern counts 3, a lexicon word 1), CASCADE_MIN_SHARE of it for one class, skip the model.
+# CASCADE=1 turns it on by default; requests can still choose with "cascade"
+CASCADE = os.environ.get("CASCADE", "0") == "1"
+CASCADE_MIN_EVIDENCE = float(os.environ.get("CASCADE_MIN_EVIDENCE", 3))
+CASCADE_MIN_SHARE = float(os.environ.get("CASCADE_MIN_SHARE", 0.8))
+
+# Token for the /admin endpoints (sent as X-Admin-Token); they are disabled when unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", 60))
+
+# Runtime metrics, served in Prometheus text format at /metrics/prometheus
+metrics_registry = MetricsRegistry()
+STAGE_LATENCY = metrics_registry.histogram(
+    "emotion_stage_latency_seconds",
+    "Time per prediction stage: parse, tokenize, tensor, forward, softmax, serialize "
+    "(forward/softmax/tensor are per batch)",
+    ["stage"]
+)
+REQUEST_LATENCY = metrics_registry.histogram(
+    "emotion_http_request_duration_seconds", "Total HTTP request time", ["endpoint"]
+)
+REQUESTS = metrics_registry.counter(
+    "emotion_http_requests_total", "HTTP requests by endpoint and status", ["endpoint", "status"]
+)
+BATCH_SIZE = metrics_registry.histogram(
+    "emotion_inference_batch_size", "Sequences per /predict forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+MODEL_LOAD_SECONDS = metrics_registry.gauge(
+    "emotion_model_load_seconds", "Time to load and warm up the current version of each model", ["model"]
+)
+MODEL_VERSION = metrics_registry.gauge(
+    "emotion_model_version", "Version of each model being served (increases on every hot swap)", ["model"]
+)
+MODEL_RELOADS = metrics_registry.counter(
+    "emotion_model_reloads_total", "Model versions swapped in after startup", ["model"]
+)
+metrics_registry.gauge(
+    "emotion_batch_queue_depth", "Requests waiting to be micro-batched",
+    fn=lambda: sum(batcher.queue_depth for batcher in batchers.values())
+)
+metrics_registry.gauge(
+    "emotion_inference_pending", "Calls running or queued on the inference pool",
+    fn=lambda: executor.pending if executor is not None else None
+)
+def cache_counts():
+    """(hits, misses) over the caches of every loaded model, or None without caches"""
+    caches = [entry.cache for entry in registry.entries() if entry.cache is not None] if registry else []
+    if not caches:
+        return None
+    return sum(c.hits for c in caches), sum(c.misses for c in caches)
+
+# Totals of the current model versions: a swap starts the new version's cache at zero
+metrics_registry.counter(
+    "emotion_prediction_cache_hits_total", "Prediction cache hits",
+    fn=lambda: (cache_counts() or (None,))[0]
+)
+metrics_registry.counter(
+    "emotion_prediction_cache_misses_total", "Prediction cache misses",
+    fn=lambda: (cache_counts() or (None, None))[1]
+)
+metrics_registry.gauge(
+    "emotion_prediction_cache_hit_ratio", "Prediction cache hits / lookups of the current model versions",
+    fn=lambda: (lambda counts: counts and counts[0] / max(sum(counts), 1))(cache_counts())
+)
+metrics_registry.counter(
+    "emotion_cascade_texts_total", "Texts from /predict and /predict_batch that went through the lexicon cascade",
+    fn=lambda: cascade.texts if cascade is not None else None
+)
+metrics_registry.counter(
+    "emotion_cascade_skipped_total", "Cascade texts answered from the lexicon, without the model",
+    fn=lambda: cascade.skipped if cascade is not None else None
+)
+metrics_registry.gauge(
+    "emotion_cascade_skip_fraction", "Fraction of cascade texts answered without a model forward pass",
+    fn=lambda: cascade.stats()['skip_fraction'] if cascade is not None else None
+)
+
+def serving_artifact(name):
+    """
+    Artifact served for a model: the MODEL_BACKEND one, or the torch
+    checkpoint for models with no TorchScript export (only the CNN has one)
+    """
+    path = backend_artifact(name, MODEL_BACKEND, MODEL_QUANTIZED)
+    if MODEL_BACKEND == 'torchscript' and not path.exists():
+        return backend_artifact(name, 'torch', MODEL_QUANTIZED)
+    return path
+
+def load_entry(name, path):
+    """Load one model version with its own cache and warm it up (runs off the event loop)"""
+    backend_name = MODEL_BACKEND
+    if MODEL_BACKEND == 'torchscript' and path != backend_artifact(name, 'torchscript'):
+        backend_name = 'torch'
+        print(f"⚠ {name}: no TorchScript export, serving {path.name} with the torch backend")
+    backend = load_backend(
+        name, backend_name, vocab_size=len(preprocessor.word2idx), quantized=MODEL_QUANTIZED, model_path=path,
+        num_threads=MODEL_THREADS or None
+    )
+    # First calls allocate buffers and pick kernels; pay for that before serving
+    for batch_size in (1, BATCH_MAX_SIZE):
+        backend.predict_proba(np.zeros((batch_size, preprocessor.max_seq_len), dtype=np.int64))
+    
+    cache = None
+    if PREDICTION_CACHE_SIZE > 0 and PREDICTION_CACHE_BACKEND == "sqlite":
+        # Keyed by the content hash of what was loaded, so stale rows are never read
+        cache = SqlitePredictionCache(
+            PREDICTION_CACHE_PATH,
+            model_hash=artifact_hash(backend.model_path, PREPROCESSOR_PATH),
+            max_size=PREDICTION_CACHE_SIZE,
+            ttl_seconds=PREDICTION_CACHE_TTL
+        )
+    elif PREDICTION_CACHE_SIZE > 0:
+        # Each version starts empty, so a swap never serves the old model's results; the
+        # registry only watches the model, so a rewritten preprocessor clears it here
+        cache = PredictionCache(
+            max_size=PREDICTION_CACHE_SIZE,
+            ttl_seconds=PREDICTION_CACHE_TTL,
+            fingerprint_fn=lambda: artifact_fingerprint(path, PREPROCESSOR_PATH)
+        )
+    
+    # Forward and softmax time go to the stage histogram
+    return ModelEntry(name, InstrumentedBackend(backend, STAGE_LATENCY), fingerprint=None, cache=cache)
+
+def on_model_swap(entry, previous):
+    global stream_model
+    if entry.name == 'cnn' and previous is not None:
+        # New /ws/predict sessions load the new weights; open ones finish on the old
+        stream_model = None
+    MODEL_LOAD_SECONDS.set(entry.load_seconds, model=entry.name)
+    MODEL_VERSION.set(entry.version, model=entry.name)
+    if previous is not None:
+        MODEL_RELOADS.inc(model=entry.name)
+
+def make_run_batch(name):
+    async def run_batch(sequences):
+        """Score sequences on the inference pool without blocking the event loop"""
+        # The entry is looked up per batch, so a swap applies from the next batch on
+        return await executor.run(predict_sequences, registry.get(name).backend, sequences)
+    return run_batch
 
 @app.on_event("startup")
 async def load_model():
-    global preprocessor, model
+    global preprocessor, registry, batchers, executor, cascade
     
     # Load preprocessor
-    preprocessor_path = Path(__file__).parent / "data" / "processed" / "preprocessor.pkl"
-    preprocessor = TextPreprocessor.load(preprocessor_path)
+    preprocessor = TextPreprocessor.load(PREPROCESSOR_PATH)
+    
+    try:
+        labels = [preprocessor.idx2label[i] for i in range(len(preprocessor.idx2label))]
+        cascade = LexiconCascade(LexiconAnalyzer(), labels, CASCADE_MIN_EVIDENCE, CASCADE_MIN_SHARE)
+    except FileNotFoundError as e:
+        print(f"⚠ Lexicon cascade disabled, rule data not found: {e.filename}")
     
-    # Load CNN model
-    vocab_size = len(preprocessor.word2idx)
-    model = CNNTextClassifier(vocab_size=vocab_size, embedding_dim=100, num_classes=4)
-    model_path = Path(__file__).parent / "exports" / "best_CNNTextClassifier.pth"
-    model.load_state_dict(torch.load(model_path, map_location=device))
-    model = model.to(device)
-    model.eval()
+    registry = ModelRegistry(
+        MODELS,
+        artifact_fn=serving_artifact,
+        load_fn=load_entry,
+        on_swap=on_model_swap
+    )
+    await asyncio.to_thread(registry.load_all)
+    if DEFAULT_MODEL not in registry:
+        raise RuntimeError(f"Default model '{DEFAULT_MODEL}' could not be loaded")
     
-    print(f"✓ Text model loaded on {device}")
+    default = registry.get(DEFAULT_MODEL).backend
+    workers = INFERENCE_WORKERS or default.num_threads
+    executor = InferenceExecutor(max_workers=workers, max_queue_size=INFERENCE_QUEUE_SIZE)
+    batchers = {}
+    for name in MODELS:
+        batchers[name] = MicroBatcher(
+            make_run_batch(name),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            max_concurrency=workers,
+            max_queue_size=INFERENCE_QUEUE_SIZE
+        )
+        batchers[name].start()
+    if MODEL_WATCH_INTERVAL > 0:
+        registry.start(MODEL_WATCH_INTERVAL)
+    
+    precision = "int8" if MODEL_QUANTIZED else "fp32"
+    loaded = ", ".join(entry.name for entry in registry.entries())
+    print(f"✓ Text models loaded ({loaded}) with {default.name} backend, {precision} ({workers} inference workers)")
+
+@app.on_event("shutdown")
+async def stop_inference():
+    if registry is not None:
+        await registry.stop()
+    for batcher in batchers.values():
+        await batcher.stop()
+    if executor is not None:
+        executor.shutdown()
 
 # ============= TEXT EMOTION ENDPOINTS =============
 
 class PredictionRequest(BaseModel):
     text: str
+    model: Optional[str] = None
+    cascade: Optional[bool] = None
 
 class PredictionResponse(BaseModel):
     emotion: str
     confidence: float
     probabilities: dict
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
-    """Predict emotion from text"""
-    try:
-        sequence = preprocessor.text_to_sequence(request.text)
-        X = torch.tensor([sequence], dtype=torch.long).to(device)
+class SourcedPredictionResponse(PredictionResponse):
+    # "model", or "lexicon" for cascade answers: then probabilities and
+    # confidence are each class's share of the rule evidence, not model
+    # probabilities, and evidence holds the rule points behind them
+    source: str
+    evidence: Optional[float] = None
+
+class BatchPredictionRequest(BaseModel):
+    texts: List[str]
+    model: Optional[str] = None
+    cascade: Optional[bool] = None
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[SourcedPredictionResponse]
+
+class EnsembleRequest(BaseModel):
+    texts: List[str]
+    models: Optional[List[str]] = None
+
+class EnsemblePrediction(PredictionResponse):
+    models: Dict[str, PredictionResponse]
+
+class EnsembleResponse(BaseModel):
+    predictions: List[EnsemblePrediction]
+
+class DocumentRequest(BaseModel):
+    text: str
+    mode: str = "sentences"
+    window: Optional[int] = None
+    stride: Optional[int] = None
+    model: Optional[str] = None
+
+class SegmentPrediction(PredictionResponse):
+    text: str
+    start: int
+    end: int
+
+class DocumentPredictionResponse(PredictionResponse):
+    segments: List[SegmentPrediction]
+
+def get_model(name):
+    """Current entry of the requested model (DEFAULT_MODEL when None)"""
+    name = name or DEFAULT_MODEL
+    if name not in MODELS:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}' (serving {', '.join(MODELS)})")
+    if name not in registry:
+        raise HTTPException(status_code=503, detail=f"Model '{name}' is not loaded yet")
+    return registry.get(name)
+
+def predict_sequences(model, sequences):
+    """Run one forward pass of a backend over a list of encoded sequences"""
+    BATCH_SIZE.observe(len(sequences))
+    with STAGE_LATENCY.time(stage='tensor'):
+        X = np.array(sequences, dtype=np.int64)
+        if model.pad_margin is not None:
+            # Pad only as far as the longest sequence in this batch needs
+            X, _ = trim_padding(X, model.pad_margin)
+    return model.predict_proba(X).tolist()
+
+def encode_texts(texts):
+    with STAGE_LATENCY.time(stage='tokenize'):
+        return preprocessor.texts_to_tensor(texts)
+
+def predict_texts(entry, texts, batch_size=None):
+    """Encode and score a list of texts with a model entry, in length buckets of batch_size"""
+    return predict_tensor(entry, encode_texts(texts), batch_size)
+
+def predict_texts_cascade(entry, texts):
+    """
+    Lexicon cascade over a batch: the rules are matched for all texts in one
+    automaton pass and only the texts they leave open are encoded and scored.
+    Returns a SourcedPredictionResponse per text.
+    """
+    with STAGE_LATENCY.time(stage='cascade'):
+        decided = cascade.decide_batch(texts)
+    results = [decision and sourced_response(*decision, source="lexicon") for decision in decided]
+    rest = [i for i, decision in enumerate(decided) if decision is None]
+    if rest:
+        for i, probs in zip(rest, predict_texts(entry, [texts[i] for i in rest])):
+            results[i] = sourced_response(probs)
+    return results
+
+def predict_tensor(entry, X, batch_size=None):
+    """Score an encoded (n, max_seq_len) array with a model entry, using its cache"""
+    batch_size = batch_size or BATCH_MAX_SIZE
+    model, cache = entry.backend, entry.cache
+    if cache is None:
+        return predict_proba_bucketed(model, X, batch_size).tolist()
+    
+    # Only rows missing from the cache go through the model
+    keys = [sequence_key(row) for row in X.tolist()]
+    results = cache.get_many(keys)
+    missing = [i for i, probs in enumerate(results) if probs is None]
+    if missing:
+        probs = predict_proba_bucketed(model, X[missing], batch_size).tolist()
+        for i, row in zip(missing, probs):
+            results[i] = row
+        cache.put_many((keys[i], results[i]) for i in missing)
+    return results
+
+async def cache_get(cache, key):
+    """Cache lookup from the event loop; file-backed caches are read in a thread"""
+    if cache.blocking:
+        return await asyncio.to_thread(cache.get, key)
+    return cache.get(key)
+
+def sourced_response(probs, evidence=None, source="model"):
+    return SourcedPredictionResponse(**to_response(probs).model_dump(), source=source, evidence=evidence)
+
+def to_response(probs):
+    """Build the response for one row of probabilities"""
+    predicted = max(range(len(probs)), key=probs.__getitem__)
+    
+    all_probs = {
+        preprocessor.idx2label[i]: float(probs[i])
+        for i in range(4)
+    }
+    
+    return PredictionResponse(
+        emotion=preprocessor.idx2label[predicted],
+        confidence=float(probs[predicted]),
+        probabilities=all_probs
+    )
+
+def mark_parsed(http_request):
+    """Record the parse stage: from the request arriving to the endpoint running"""
+    received = getattr(http_request.state, 'received', None)
+    if received is not None:
+        STAGE_LATENCY.observe(time.perf_counter() - received, stage='parse')
+
+def mark_handled(http_request):
+    """Start of the serialize stage, closed by the metrics middleware"""
+    http_request.state.handled = time.perf_counter()
+
+class RequestMetricsMiddleware:
+    """
+    Request count and latency per route, plus the serialize stage.
+    Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware runs
+    every request through an extra task and memory streams, which doubled
+    the latency of cached /predict calls. Timing ends when the app is done
+    sending the response.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
         
-        with torch.no_grad():
-            outputs = model(X)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            confidence, predicted = torch.max(probabilities, 1)
+        # request.state reads and writes scope["state"]
+        state = scope.setdefault('state', {})
+        received = state['received'] = time.perf_counter()
+        status = 500
         
-        emotion = preprocessor.idx2label[predicted.item()]
-        conf = confidence.item()
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
         
-        all_probs = {
-            preprocessor.idx2label[i]: float(probabilities[0][i].item())
-            for i in range(4)
-        }
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            now = time.perf_counter()
+            handled = state.get('handled')
+            if handled is not None:
+                # Response model validation and JSON rendering happen after the endpoint returns
+                STAGE_LATENCY.observe(now - handled, stage='serialize')
+            # Route templates as labels, so unknown paths can't blow up cardinality
+            endpoint = getattr(scope.get('route'), 'path', 'unmatched')
+            REQUESTS.inc(endpoint=endpoint, status=status)
+            REQUEST_LATENCY.observe(now - received, endpoint=endpoint)
+            if profile_capture is not None:
+                profile_capture.request_done()
+
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.post("/predict", response_model=SourcedPredictionResponse)
+async def predict(request: PredictionRequest, http_request: Request):
+    """
+    Predict emotion from text. With the cascade (CASCADE=1 or "cascade": true),
+    texts with strong, unambiguous lexicon evidence are answered from the rules
+    ("source": "lexicon") and only the rest reach the model.
+    """
+    mark_parsed(http_request)
+    entry = get_model(request.model)
+    cache = entry.cache
+    use_cascade = CASCADE if request.cascade is None else request.cascade
+    if use_cascade and cascade is None:
+        raise HTTPException(status_code=503, detail="Lexicon cascade not available")
+    try:
+        if use_cascade:
+            with STAGE_LATENCY.time(stage='cascade'):
+                decision = cascade.decide(request.text)
+            if decision is not None:
+                mark_handled(http_request)
+                return sourced_response(*decision, source="lexicon")
         
-        return PredictionResponse(
-            emotion=emotion,
-            confidence=conf,
-            probabilities=all_probs
+        with STAGE_LATENCY.time(stage='tokenize'):
+            sequence = preprocessor.text_to_sequence(request.text)
+        
+        key = sequence_key(sequence)
+        probs = await cache_get(cache, key) if cache is not None else None
+        if probs is None:
+            probs = await batchers[entry.name].submit(sequence)
+            if cache is not None:
+                cache.put(key, probs)
+        
+        mark_handled(http_request)
+        return sourced_response(probs)
+    
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict_batch", response_model=BatchPredictionResponse)
+async def predict_batch(request: BatchPredictionRequest, http_request: Request):
+    """Predict emotions for a list of texts, batched by length (with the lexicon cascade, see /predict)"""
+    mark_parsed(http_request)
+    entry = get_model(request.model)
+    use_cascade = CASCADE if request.cascade is None else request.cascade
+    if use_cascade and cascade is None:
+        raise HTTPException(status_code=503, detail="Lexicon cascade not available")
+    if len(request.texts) > PREDICT_BATCH_MAX_TEXTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many texts: {len(request.texts)} > {PREDICT_BATCH_MAX_TEXTS}"
+        )
+    if not request.texts:
+        return BatchPredictionResponse(predictions=[])
+    
+    try:
+        # Encoding runs on the inference pool too, so large batches don't stall the loop
+        if use_cascade:
+            predictions = await executor.run(predict_texts_cascade, entry, request.texts)
+        else:
+            predictions = [sourced_response(probs) for probs in await executor.run(predict_texts, entry, request.texts)]
+        mark_handled(http_request)
+        return BatchPredictionResponse(predictions=predictions)
+    
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict_ensemble", response_model=EnsembleResponse)
+async def predict_ensemble(request: EnsembleRequest, http_request: Request):
+    """
+    Average of several models (ENSEMBLE_MODELS by default) for a list of texts,
+    with each model's own prediction under "models". The texts are encoded
+    once and every model scores the same array on its own pool thread, so
+    the forward passes overlap (torch and onnxruntime release the GIL).
+    """
+    mark_parsed(http_request)
+    entries = [get_model(name) for name in dict.fromkeys(request.models or ENSEMBLE_MODELS)]
+    if len(request.texts) > PREDICT_BATCH_MAX_TEXTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many texts: {len(request.texts)} > {PREDICT_BATCH_MAX_TEXTS}"
+        )
+    if not request.texts:
+        return EnsembleResponse(predictions=[])
+    
+    try:
+        X = await executor.run(encode_texts, request.texts)
+        member_probs = await asyncio.gather(*(executor.run(predict_tensor, entry, X) for entry in entries))
+        combined = np.mean(member_probs, axis=0).tolist()
+        mark_handled(http_request)
+        return EnsembleResponse(predictions=[
+            EnsemblePrediction(
+                **to_response(probs).model_dump(),
+                models={entry.name: to_response(member[i]) for entry, member in zip(entries, member_probs)}
+            )
+            for i, probs in enumerate(combined)
+        ])
+    
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict_document", response_model=DocumentPredictionResponse)
+async def predict_document(request: DocumentRequest, http_request: Request):
+    """
+    Emotions of a text of any length: one prediction per sentence (mode="sentences")
+    or per overlapping window of `window` tokens every `stride` tokens (mode="windows"),
+    plus the document distribution (segments averaged by the tokens they cover).
+    All segments go through the model in a single forward pass.
+    """
+    mark_parsed(http_request)
+    entry = get_model(request.model)
+    window = request.window or preprocessor.max_seq_len
+    stride = request.stride or max(window // 2, 1)
+    if not 1 <= window <= preprocessor.max_seq_len:
+        raise HTTPException(status_code=422, detail=f"window must be between 1 and {preprocessor.max_seq_len}")
+    try:
+        segments = segment_document(request.text, request.mode, window, stride)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if len(segments) > PREDICT_DOCUMENT_MAX_SEGMENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many segments: {len(segments)} > {PREDICT_DOCUMENT_MAX_SEGMENTS}"
+        )
+    
+    try:
+        texts = [text for text, _, _ in segments]
+        probs = await executor.run(predict_texts, entry, texts, len(texts))
+        document_probs = aggregate(probs, segment_weights(segments)).tolist()
+        mark_handled(http_request)
+        return DocumentPredictionResponse(
+            **to_response(document_probs).model_dump(),
+            segments=[
+                SegmentPrediction(text=text, start=start, end=end, **to_response(p).model_dump())
+                for (text, start, end), p in zip(segments, probs)
+            ]
         )
     
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def iter_upload_lines(upload):
+    """
+    Yield (line_number, raw bytes) for each line of an uploaded file, reading
+    PREDICT_FILE_CHUNK_BYTES at a time. Lines over PREDICT_FILE_MAX_LINE_BYTES
+    are dropped as they are read and yielded as None.
+    """
+    buffer = b""
+    line_number = 0
+    too_long = False
+    while True:
+        chunk = await upload.read(PREDICT_FILE_CHUNK_BYTES)
+        if not chunk:
+            break
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for raw in lines:
+            line_number += 1
+            yield line_number, None if too_long else raw
+            too_long = False
+        if len(buffer) > PREDICT_FILE_MAX_LINE_BYTES:
+            buffer = b""
+            too_long = True
+    if buffer or too_long:
+        yield line_number + 1, None if too_long else buffer
+
+def parse_upload_line(raw, fmt, text_field):
+    """Text of one uploaded line, or None for blank lines"""
+    line = raw.decode("utf-8", errors="replace").strip()
+    if not line:
+        return None
+    if fmt == "text":
+        return line
+    record = json.loads(line)
+    text = record.get(text_field) if isinstance(record, dict) else None
+    if not isinstance(text, str):
+        raise ValueError(f"missing '{text_field}'")
+    return text
+
+async def predict_texts_waiting(entry, texts):
+    """predict_texts on the inference pool, waiting for room instead of failing with 429"""
+    while True:
+        try:
+            return await executor.run(predict_texts, entry, texts)
+        except QueueFullError:
+            await asyncio.sleep(0.05)
+
+async def score_upload_batch(entry, batch):
+    """NDJSON lines for a batch of (line_number, text, error) entries, in order"""
+    texts = [text for _, text, error in batch if error is None]
+    probs = iter(await predict_texts_waiting(entry, texts)) if texts else iter(())
+    
+    lines = []
+    for line_number, text, error in batch:
+        if error is not None:
+            row = {"line": line_number, "error": error}
+        else:
+            row = {"line": line_number, **to_response(next(probs)).model_dump()}
+        lines.append(json.dumps(row, ensure_ascii=False) + "\n")
+    return "".join(lines)
+
+async def stream_upload_predictions(upload, fmt, text_field, entry):
+    batch = []
+    try:
+        async for line_number, raw in iter_upload_lines(upload):
+            if raw is None:
+                batch.append((line_number, None, f"line longer than {PREDICT_FILE_MAX_LINE_BYTES} bytes"))
+            else:
+                try:
+                    text = parse_upload_line(raw, fmt, text_field)
+                except ValueError as e:
+                    batch.append((line_number, None, str(e)))
+                else:
+                    if text is not None:
+                        batch.append((line_number, text, None))
+            
+            if len(batch) >= PREDICT_FILE_BATCH_SIZE:
+                yield await score_upload_batch(entry, batch)
+                batch = []
+        if batch:
+            yield await score_upload_batch(entry, batch)
+    finally:
+        await upload.close()
+
+@app.post("/predict_file")
+async def predict_file(file: UploadFile = File(...), format: str = "auto", text_field: str = "text",
+                       model: Optional[str] = None):
+    """
+    Score every line of an uploaded file and stream the results back as NDJSON
+    ({"line": n, "emotion": ..., ...} or {"line": n, "error": ...}) while reading.
+    format: "text" (one text per line), "jsonl" (records with text_field)
+    or "auto" (jsonl for .jsonl/.ndjson files, text otherwise).
+    The whole file is scored by the model version current when the upload starts.
+    """
+    entry = get_model(model)
+    if format == "auto":
+        suffix = Path(file.filename or "").suffix.lower()
+        format = "jsonl" if suffix in (".jsonl", ".ndjson") else "text"
+    if format not in ("text", "jsonl"):
+        raise HTTPException(status_code=422, detail="format must be 'auto', 'text' or 'jsonl'")
+    
+    return StreamingResponse(
+        stream_upload_predictions(file, format, text_field, entry),
+        media_type="application/x-ndjson"
+    )
+
+def load_stream_model():
+    """IncrementalCNN over the fp32 torch CNN (whatever MODEL_BACKEND serves), on CPU"""
+    import torch
+    from serving.backends import TorchBackend
+    from serving.incremental import IncrementalCNN
+    backend = TorchBackend('cnn', len(preprocessor.word2idx), device=torch.device('cpu'))
+    return IncrementalCNN(backend.model, preprocessor.max_seq_len)
+
+def text_to_tokens(text):
+    """Token ids of a text without padding, truncated to max_seq_len like text_to_sequence"""
+    max_seq_len = preprocessor.max_seq_len
+    words = text.lower().split(None, max_seq_len)[:max_seq_len]
+    return [preprocessor.word2idx.get(word, 1) for word in words]
+
+@app.websocket("/ws/predict")
+async def predict_stream(websocket: WebSocket):
+    """
+    Live predictions for a growing text, e.g. a speech-to-text transcript.
+    Each message is {"text": ...} with the whole text so far; each reply is
+    a /predict response plus "tokens" (tokens used), "reused_tokens" (prefix
+    kept from the previous message) and "computed_windows". Only the conv
+    windows after the reused prefix are computed, so appending a word costs
+    the same however long the text already is.
+    """
+    global stream_model, stream_model_lock
+    await websocket.accept()
+    if stream_model is None:
+        stream_model_lock = stream_model_lock or asyncio.Lock()
+        async with stream_model_lock:
+            if stream_model is None:
+                stream_model = await asyncio.to_thread(load_stream_model)
+    session = stream_model.session()
+    
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                payload = json.loads(message)
+                text = payload.get("text") if isinstance(payload, dict) else None
+                if not isinstance(text, str):
+                    raise ValueError("expected {\"text\": ...}")
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+            
+            tokens = text_to_tokens(text)
+            try:
+                logits, reused, computed = await executor.run(session.update, tokens)
+            except QueueFullError as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+            probs = softmax(logits.numpy()[None])[0].tolist()
+            await websocket.send_json({
+                **to_response(probs).model_dump(),
+                "tokens": len(tokens),
+                "reused_tokens": reused,
+                "computed_windows": computed,
+            })
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and size of the prediction cache of each loaded model"""
+    caches = {entry.name: entry.cache for entry in registry.entries() if entry.cache is not None}
+    if not caches:
+        return {"enabled": False}
+    # Top-level counters are the default model's, as before there was more than one
+    default = caches.get(DEFAULT_MODEL)
+    return {
+        "enabled": True,
+        **(default.stats() if default is not None else {}),
+        "models": {name: cache.stats() for name, cache in caches.items()}
+    }
+
+@app.get("/cascade/stats")
+async def cascade_stats():
+    """How many texts (from /predict and /predict_batch) went through the lexicon cascade and what fraction skipped the model"""
+    if cascade is None:
+        return {"enabled": False}
+    return {"enabled": True, "default": CASCADE, **cascade.stats()}
+
+@app.get("/models")
+async def list_models():
+    """Models served, with the version, artifact and load time of each (null: not loaded)"""
+    return {"default": DEFAULT_MODEL, "models": registry.status() if registry is not None else {}}
+
+# ============= ADMIN ENDPOINTS =============
+
+def require_admin(token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profile")
+async def capture_profile(seconds: float = 5.0, requests: int = 0,
+                          x_admin_token: str = Header(None)):
+    """
+    Profile the server for `seconds` (or until `requests` requests complete,
+    within `seconds`). Returns a zip with a torch.profiler Chrome trace,
+    Python stacks in collapsed (flamegraph) format and a text summary.
+    """
+    global profile_capture
+    require_admin(x_admin_token)
+    if profile_capture is not None:
+        raise HTTPException(status_code=409, detail="A profile capture is already running")
+    if seconds <= 0 or requests < 0:
+        raise HTTPException(status_code=422, detail="seconds must be > 0 and requests >= 0")
+    
+    # torch.profiler only when the model runs on torch (the ONNX backend never imports it)
+    capture = ProfileCapture(profile_torch=MODEL_BACKEND != 'onnx')
+    profile_capture = capture
+    capture.start()
+    try:
+        await capture.wait(min(seconds, PROFILE_MAX_SECONDS), requests)
+    finally:
+        profile_capture = None
+        capture.stop()
+    
+    archive = await asyncio.to_thread(capture.archive)
+    return Response(
+        archive,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="profile.zip"'}
+    )
+
 # ============= FACIAL EMOTION ENDPOINTS =============
 
 @app.post("/analyze-face")
@@ -144,7 +918,18 @@ async def analyze_face(file: UploadFile = File(...)):
 @app.get("/health")
 async def health():
     """Health check"""
-    return {"status": "ok", "model_loaded": model is not None}
+    return {
+        "status": "ok",
+        "model_loaded": registry is not None and DEFAULT_MODEL in registry,
+        "models_loaded": [entry.name for entry in registry.entries()] if registry is not None else [],
+        "queue_depth": sum(batcher.queue_depth for batcher in batchers.values()),
+        "inference_pending": executor.pending if executor is not None else 0
+    }
+
+@app.get("/metrics/prometheus")
+async def prometheus_metrics():
+    """Runtime metrics (stage latencies, requests, queue, cache) in Prometheus text format"""
+    return Response(metrics_registry.render(), media_type=MetricsRegistry.CONTENT_TYPE)
 
 @app.get("/metrics")
 async def get_metrics():
@@ -0,0 +1,438 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import sys
+import numpy as np
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from bench.stages import CORPUS_PATH
+
+ML_DIR = Path(__file__).parent.parent
+
+# Upper edges (ms) of the latency histogram buckets
+HISTOGRAM_EDGES_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+
+# ============= HTTP CLIENT =============
+# Minimal HTTP/1.1 keep-alive client on asyncio streams, so the harness
+# needs nothing beyond the standard library and runs fully offline.
+
+class HttpConnection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=b''):
+        """Send one request, return (status, body)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        self.writer.write(head.encode('ascii') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            payload = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            payload = await self._read_chunked()
+        else:
+            payload = await self.reader.read()
+            self.close()
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, payload
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class ConnectionPool:
+    """At most `size` keep-alive connections; callers wait for a free one"""
+    def __init__(self, host, port, size):
+        self._free = asyncio.Queue()
+        for _ in range(size):
+            self._free.put_nowait(HttpConnection(host, port))
+
+    async def request(self, method, path, body=b''):
+        conn = await self._free.get()
+        try:
+            return await conn.request(method, path, body)
+        except Exception:
+            conn.close()
+            raise
+        finally:
+            self._free.put_nowait(conn)
+
+    def close(self):
+        while not self._free.empty():
+            self._free.get_nowait().close()
+
+# ============= SERVER AND RESOURCE USAGE =============
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(port, workers=1, env=None):
+    """Run ml/api.py under uvicorn on localhost"""
+    command = [
+        sys.executable, '-m', 'uvicorn', 'api:app',
+        '--host', '127.0.0.1', '--port', str(port),
+        '--workers', str(workers), '--log-level', 'warning'
+    ]
+    return subprocess.Popen(command, cwd=ML_DIR, env={**os.environ, **(env or {})})
+
+async def wait_until_ready(host, port, process=None, timeout=120.0):
+    """Poll /health until the model is loaded"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"API server exited with status {process.returncode}")
+        conn = HttpConnection(host, port)
+        try:
+            status, body = await conn.request('GET', '/health')
+            if status == 200 and json.loads(body).get('model_loaded'):
+                return
+        except (OSError, ValueError):
+            pass
+        finally:
+            conn.close()
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"API server not ready after {timeout:.0f}s")
+
+def process_tree(pid):
+    """pid and all of its descendants (uvicorn workers), from /proc"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat', 'rb') as f:
+                    # Fields after the parenthesized command name
+                    fields = f.read().rsplit(b')', 1)[1].split()
+                parents.setdefault(int(fields[1]), []).append(int(entry))
+            except OSError:
+                continue
+    tree = [pid]
+    for current in tree:
+        tree.extend(parents.get(current, []))
+    return tree
+
+def process_usage(pid):
+    """(cpu seconds, rss bytes) of a process tree, or None without /proc"""
+    if not os.path.isdir('/proc'):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    cpu = 0.0
+    rss = 0
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/stat', 'rb') as f:
+                fields = f.read().rsplit(b')', 1)[1].split()
+        except OSError:
+            continue
+        # utime, stime and rss are fields 14, 15 and 24 of /proc/<pid>/stat
+        cpu += (int(fields[11]) + int(fields[12])) / ticks
+        rss += int(fields[21]) * page_size
+    return cpu, rss
+
+class UsageSampler:
+    """Samples CPU and RSS of the server process tree while a step runs"""
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.rss_samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            usage = process_usage(self.pid)
+            if usage is not None:
+                self.rss_samples.append(usage[1])
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._start = (time.monotonic(), process_usage(self.pid))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        started, start_usage = self._start
+        end_usage = process_usage(self.pid)
+        if start_usage is None or end_usage is None:
+            return None
+        elapsed = time.monotonic() - started
+        return {
+            'cpu_percent': 100 * (end_usage[0] - start_usage[0]) / elapsed,
+            'rss_mb_max': max(self.rss_samples + [end_usage[1]]) / 2**20,
+            'rss_mb_end': end_usage[1] / 2**20,
+        }
+
+# ============= LOAD GENERATION =============
+
+def load_texts(path=CORPUS_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [record['text'] for record in json.load(f)]
+
+def make_payloads(texts, endpoint, batch_size, seed=0):
+    """Request bodies replaying the corpus in a shuffled order"""
+    rng = np.random.default_rng(seed)
+    order = [texts[i] for i in rng.permutation(len(texts))]
+    if endpoint == 'predict':
+        return [json.dumps({'text': text}).encode('utf-8') for text in order]
+    return [
+        json.dumps({'texts': order[i:i + batch_size]}).encode('utf-8')
+        for i in range(0, len(order), batch_size)
+    ]
+
+class StepRecorder:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = {}
+
+    def record(self, latency, status=None, error=None):
+        if error is not None:
+            name = error.__class__.__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if 200 <= status < 300:
+            self.latencies.append(latency)
+
+async def timed_request(pool, path, body, started, recorder):
+    """One request; latency counts from `started` (the scheduled send time)"""
+    try:
+        status, _ = await pool.request('POST', path, body)
+    except Exception as e:
+        recorder.record(None, error=e)
+        return
+    recorder.record(time.perf_counter() - started, status=status)
+
+async def closed_loop(pool, path, payloads, concurrency, duration, recorder):
+    """`concurrency` clients, each sending its next request once the last one returns"""
+    deadline = time.perf_counter() + duration
+    counter = iter(range(10**12))
+
+    async def client():
+        while time.perf_counter() < deadline:
+            body = payloads[next(counter) % len(payloads)]
+            await timed_request(pool, path, body, time.perf_counter(), recorder)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+async def open_loop(pool, path, payloads, rate, duration, recorder):
+    """
+    Requests sent at a fixed rate regardless of how fast the server answers.
+    Latency is measured from each request's scheduled time, so time spent
+    waiting for a free connection counts (no coordinated omission).
+    """
+    start = time.perf_counter()
+    tasks = []
+    for i in range(int(rate * duration)):
+        scheduled = start + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        body = payloads[i % len(payloads)]
+        tasks.append(asyncio.create_task(timed_request(pool, path, body, scheduled, recorder)))
+    await asyncio.gather(*tasks)
+
+def summarize(recorder, elapsed, texts_per_request):
+    latencies_ms = np.array(recorder.latencies) * 1000
+    ok = len(latencies_ms)
+    total = sum(recorder.statuses.values()) + sum(recorder.errors.values())
+    summary = {
+        'requests': total,
+        'ok': ok,
+        'error_rate': (total - ok) / total if total else 0.0,
+        'statuses': {str(status): count for status, count in sorted(recorder.statuses.items())},
+        'errors': recorder.errors,
+        'throughput_rps': ok / elapsed,
+        'texts_per_s': ok * texts_per_request / elapsed,
+    }
+    if ok:
+        summary['latency_ms'] = {
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p90': float(np.percentile(latencies_ms, 90)),
+            'p99': float(np.percentile(latencies_ms, 99)),
+            'p999': float(np.percentile(latencies_ms, 99.9)),
+            'max': float(latencies_ms.max()),
+            'mean': float(latencies_ms.mean()),
+        }
+        counts = np.histogram(latencies_ms, bins=(0,) + HISTOGRAM_EDGES_MS)[0]
+        summary['histogram_ms'] = {
+            f"<={edge:g}" if edge != float('inf') else f">{HISTOGRAM_EDGES_MS[-2]:g}": int(count)
+            for edge, count in zip(HISTOGRAM_EDGES_MS, counts)
+        }
+    return summary
+
+async def run_step(pool, endpoint, payloads, mode, level, duration, batch_size, server_pid):
+    recorder = StepRecorder()
+    sampler = UsageSampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+    client_start = os.times()
+    start = time.perf_counter()
+
+    path = f"/{endpoint}"
+    if mode == 'rate':
+        await open_loop(pool, path, payloads, level, duration, recorder)
+    else:
+        await closed_loop(pool, path, payloads, level, duration, recorder)
+
+    elapsed = time.perf_counter() - start
+    client_end = os.times()
+    summary = summarize(recorder, elapsed, batch_size if endpoint != 'predict' else 1)
+    summary.update({'endpoint': endpoint, 'mode': mode, mode: level, 'duration_s': elapsed})
+    summary['client_cpu_percent'] = 100 * (
+        (client_end.user - client_start.user) + (client_end.system - client_start.system)
+    ) / elapsed
+    if sampler:
+        summary['server'] = await sampler.stop()
+    return summary
+
+def print_step(step):
+    level = f"{step['mode']}={step[step['mode']]}"
+    line = (f"{step['endpoint']:<14}{level:<16}{step['throughput_rps']:>9.1f} req/s"
+            f"{step['error_rate']:>8.1%} err")
+    if 'latency_ms' in step:
+        latency = step['latency_ms']
+        line += f"   p50 {latency['p50']:7.1f}  p90 {latency['p90']:7.1f}  p99 {latency['p99']:7.1f} ms"
+    if step.get('server'):
+        line += f"   server cpu {step['server']['cpu_percent']:5.0f}%  rss {step['server']['rss_mb_max']:6.0f} MB"
+    print(line)
+
+def print_histogram(step, width=40):
+    histogram = step.get('histogram_ms')
+    if not histogram:
+        return
+    peak = max(histogram.values()) or 1
+    for bucket, count in histogram.items():
+        if count:
+            print(f"    {bucket:>8} ms {'█' * max(1, round(width * count / peak)):<{width}} {count}")
+
+def saturation(steps, max_error_rate=0.01):
+    """Step with the highest throughput among those under max_error_rate"""
+    healthy = [step for step in steps if step['error_rate'] <= max_error_rate]
+    return max(healthy, key=lambda step: step['throughput_rps']) if healthy else None
+
+async def run(args):
+    host = '127.0.0.1'
+    server = None
+    if args.url:
+        host, port = args.url.rsplit(':', 1)
+        host = host.split('//')[-1]
+        port = int(port)
+        server_pid = args.server_pid
+    else:
+        port = free_port()
+        env = {'PREDICTION_CACHE_SIZE': '0'} if args.no_cache else {}
+        server = start_server(port, args.workers, env)
+        server_pid = server.pid
+        print(f"Starting API on {host}:{port} ({args.workers} worker(s))...")
+
+    try:
+        await wait_until_ready(host, port, server)
+        texts = load_texts(args.corpus)
+        levels = [('rate', float(rate)) for rate in args.rates.split(',') if rate] if args.rates else \
+                 [('concurrency', int(c)) for c in args.concurrency.split(',')]
+        max_connections = max(int(c) for c in args.concurrency.split(','))
+
+        steps = []
+        for endpoint in args.endpoints.split(','):
+            payloads = make_payloads(texts, endpoint, args.batch_size)
+            print(f"\n/{endpoint} ({len(payloads)} distinct payloads, {args.duration:g}s per step)")
+            endpoint_steps = []
+            for mode, level in levels:
+                connections = level if mode == 'concurrency' else max_connections
+                pool = ConnectionPool(host, port, connections)
+                try:
+                    # Short warm-up so connection setup and first batches are not measured
+                    await closed_loop(pool, f"/{endpoint}", payloads, min(connections, 4),
+                                      args.warmup, StepRecorder())
+                    step = await run_step(pool, endpoint, payloads, mode, level, args.duration,
+                                          args.batch_size, server_pid)
+                finally:
+                    pool.close()
+                print_step(step)
+                if args.histogram:
+                    print_histogram(step)
+                endpoint_steps.append(step)
+
+            peak = saturation(endpoint_steps)
+            if peak:
+                print(f"  Peak: {peak['throughput_rps']:.1f} req/s ({peak['texts_per_s']:.0f} texts/s) "
+                      f"at {peak['mode']}={peak[peak['mode']]}")
+            steps.extend(endpoint_steps)
+        return steps
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the emotion API on localhost")
+    parser.add_argument('--endpoints', default='predict,predict_batch',
+                        help="Comma-separated endpoints (predict, predict_batch, predict_ensemble)")
+    parser.add_argument('--concurrency', default='1,8,32',
+                        help="Closed-loop client counts (also the connection limit of --rates)")
+    parser.add_argument('--rates', default=None, help="Open-loop request rates per second, e.g. 50,100,200")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per step")
+    parser.add_argument('--warmup', type=float, default=1.0, help="Unmeasured seconds before each step")
+    parser.add_argument('--batch-size', type=int, default=32, help="Texts per /predict_batch request")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument('--no-cache', action='store_true', help="Start the server with the prediction cache off")
+    parser.add_argument('--url', default=None, help="Use an already running server (host:port) instead")
+    parser.add_argument('--server-pid', type=int, default=None, help="PID to sample CPU/RSS from with --url")
+    parser.add_argument('--corpus', default=str(CORPUS_PATH))
+    parser.add_argument('--histogram', action='store_true', help="Print a latency histogram per step")
+    parser.add_argument('--output', default=None, help="Write all steps as JSON")
+    args = parser.parse_args()
+
+    steps = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(steps, f, indent=2)
+        print(f"\n✓ Results saved to {args.output}")
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import platform
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from bench.stages import BATCH_SIZES, run_all
+
+BENCH_DIR = Path(__file__).parent
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+RESULTS_PATH = BENCH_DIR / "results" / "latest.json"
+
+def environment():
+    """Machine and library versions the numbers were measured with"""
+    import numpy as np
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+    }
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    try:
+        info['git_commit'] = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+def save_results(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    return path
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Compare median latencies against a baseline. Returns the names of the
+    benchmarks more than `tolerance` (relative) slower than the baseline,
+    and of those the baseline has no entry for (unguarded).
+    """
+    regressions = []
+    unguarded = []
+    print(f"\n{'benchmark':<36}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for name, stats in results.items():
+        if name not in baseline:
+            unguarded.append(name)
+            print(f"{name:<36}{'-':>14}{stats['median_ms']:>14.3f}{'new':>10}")
+            continue
+        before = baseline[name]['median_ms']
+        change = stats['median_ms'] / before - 1 if before else 0.0
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  ✗ slower'
+        elif change < -tolerance:
+            flag = '  ✓ faster'
+        print(f"{name:<36}{before:>14.3f}{stats['median_ms']:>14.3f}{change:>+10.1%}{flag}")
+    for name in baseline:
+        if name not in results:
+            print(f"{name:<36}{baseline[name]['median_ms']:>14.3f}{'-':>14}{'missing':>10}")
+    return regressions, unguarded
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the text emotion pipeline")
+    parser.add_argument('--models', default='cnn,lstm', help="Comma-separated model types")
+    parser.add_argument('--backends', default='torch,torchscript',
+                        help="Comma-separated backends (skipped when their artifact is missing)")
+    parser.add_argument('--batch-sizes', default=','.join(map(str, BATCH_SIZES)))
+    parser.add_argument('--no-endpoint', action='store_true', help="Skip the end-to-end /predict benchmark")
+    parser.add_argument('--no-lexicon', action='store_true', help="Skip the lexicon rule matching benchmark")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per end-to-end run")
+    parser.add_argument('--output', default=str(RESULTS_PATH))
+    parser.add_argument('--baseline', default=str(BASELINE_PATH))
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown vs the baseline")
+    parser.add_argument('--update-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="Exit with status 1 on regressions or benchmarks missing from the baseline")
+    args = parser.parse_args()
+
+    results = run_all(
+        models=args.models.split(','),
+        backends=args.backends.split(','),
+        batch_sizes=[int(size) for size in args.batch_sizes.split(',')],
+        endpoint=not args.no_endpoint,
+        endpoint_requests=args.requests,
+        lexicon=not args.no_lexicon
+    )
+    output = save_results(results, args.output)
+    print(f"\n✓ Results saved to {output}")
+
+    if args.update_baseline:
+        save_results(results, args.baseline)
+        print(f"✓ Baseline updated: {args.baseline}")
+        sys.exit(0)
+
+    if not Path(args.baseline).exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        sys.exit(0)
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions, unguarded = compare(results, baseline, args.tolerance)
+    if unguarded:
+        print(f"\n✗ {len(unguarded)} benchmark(s) not in the baseline; run with --update-baseline to guard them")
+    if regressions:
+        print(f"\n✗ {len(regressions)} benchmark(s) more than {args.tolerance:.0%} slower than the baseline")
+    else:
+        print("\n✓ No regressions against the baseline")
+    if args.fail_on_regression and (regressions or unguarded):
+        sys.exit(1)
@@ -0,0 +1,211 @@
+import json
+import time
+import asyncio
+import numpy as np
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from scripts.prepare_data import TextPreprocessor
+from scripts.bucketing import trim_padding
+from serving.backends import backend_artifact, load_backend, softmax
+from serving.lexicon import ENGINES, LexiconAnalyzer
+
+PREPROCESSOR_PATH = Path(__file__).parent.parent / "data" / "processed" / "preprocessor.pkl"
+CORPUS_PATH = Path(__file__).parent.parent / "data" / "raw" / "synthetic_dataset.json"
+
+BATCH_SIZES = (1, 8, 32, 128, 512, 1024)
+
+def load_corpus(path=CORPUS_PATH, size=1024, seed=0):
+    """Sample of real texts from the dataset, repeated if it is smaller than size"""
+    with open(path, 'r', encoding='utf-8') as f:
+        texts = [record['text'] for record in json.load(f)]
+    rng = np.random.default_rng(seed)
+    return [texts[i] for i in rng.integers(0, len(texts), size)]
+
+def measure(fn, items=1, min_repeats=5, max_repeats=200, min_time=0.5, warmup=2):
+    """
+    Time fn() until it ran min_time seconds (between min_repeats and
+    max_repeats calls). Returns latency stats in ms and items per second.
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    total = 0.0
+    while len(times) < max_repeats and (len(times) < min_repeats or total < min_time):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+    times_ms = np.array(times) * 1000
+    median = float(np.median(times_ms))
+    return {
+        'median_ms': median,
+        'p90_ms': float(np.percentile(times_ms, 90)),
+        'mean_ms': float(times_ms.mean()),
+        'min_ms': float(times_ms.min()),
+        'repeats': len(times),
+        'items': items,
+        'items_per_s': items / (median / 1000) if median else float('inf'),
+    }
+
+def bench_tokenize(preprocessor, texts):
+    """Per-text encoding and whole-batch encoding into a padded array"""
+    results = {}
+    results['tokenize.text_to_sequence'] = measure(
+        lambda: [preprocessor.text_to_sequence(text) for text in texts], items=len(texts)
+    )
+    results['tokenize.texts_to_tensor'] = measure(
+        lambda: preprocessor.texts_to_tensor(texts), items=len(texts)
+    )
+    return results
+
+def bench_forward(backend, X, batch_sizes=BATCH_SIZES):
+    """Forward pass (logits only) at each batch size, padded as the API pads them"""
+    results = {}
+    for batch_size in batch_sizes:
+        batch = np.resize(X, (batch_size, X.shape[1]))
+        if backend.pad_margin is not None:
+            batch, _ = trim_padding(batch, backend.pad_margin)
+        key = f"forward.{backend.model_type}.{backend.name}.b{batch_size}"
+        results[key] = measure(lambda: backend.logits(batch), items=batch_size)
+    return results
+
+def bench_postprocess(preprocessor, logits):
+    """Softmax and top-1 label lookup over a batch of logits"""
+    labels = preprocessor.idx2label
+
+    def top1():
+        probs = softmax(logits)
+        predicted = probs.argmax(axis=1)
+        return [
+            (labels[int(p)], float(row[p]), {labels[i]: float(row[i]) for i in range(len(row))})
+            for p, row in zip(predicted, probs)
+        ]
+
+    return {
+        'postprocess.softmax': measure(lambda: softmax(logits), items=len(logits)),
+        'postprocess.softmax_top1': measure(top1, items=len(logits)),
+    }
+
+async def _bench_endpoint(texts, requests):
+    import httpx
+    import api
+
+    cache_size = api.PREDICTION_CACHE_SIZE
+    cases = [
+        ('e2e.predict.uncached', 0, [{'text': text} for text in texts[:requests]]),
+        ('e2e.predict.cached', cache_size or 10000, [{'text': texts[0]}] * requests),
+    ]
+    results = {}
+    transport = httpx.ASGITransport(app=api.app)
+    for key, size, payloads in cases:
+        # The cache is part of each loaded model version, so it is switched
+        # through the config and the models are loaded again for each case.
+        # ASGITransport does not run startup/shutdown events, so do it here
+        api.PREDICTION_CACHE_SIZE = size
+        await api.load_model()
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                async def run(payloads):
+                    for payload in payloads:
+                        response = await client.post("/predict", json=payload)
+                        response.raise_for_status()
+
+                async def timed(payloads):
+                    # One measure() sample is a sequential run of all payloads
+                    start = time.perf_counter()
+                    await run(payloads)
+                    return time.perf_counter() - start
+
+                if size:
+                    await run(payloads[:1])
+                await run(payloads[:10])
+                times = [await timed(payloads) for _ in range(5)]
+        finally:
+            await api.stop_inference()
+            api.PREDICTION_CACHE_SIZE = cache_size
+
+        per_request = np.array(times) * 1000 / len(payloads)
+        median = float(np.median(per_request))
+        results[key] = {
+            'median_ms': median,
+            'p90_ms': float(np.percentile(per_request, 90)),
+            'mean_ms': float(per_request.mean()),
+            'min_ms': float(per_request.min()),
+            'repeats': len(times),
+            'items': 1,
+            'items_per_s': 1000 / median,
+        }
+    return results
+
+def bench_endpoint(texts, requests=200):
+    """
+    Sequential /predict requests through an in-process ASGI client
+    (no network), with the prediction cache off and on. Times are per request.
+    """
+    return asyncio.run(_bench_endpoint(texts, requests))
+
+def bench_lexicon(texts):
+    """
+    Rule analysis (src/data lexicon and patterns) per text with each matching
+    engine, and the automaton over the whole batch. All engines must agree
+    before they are timed.
+    """
+    analyzer = LexiconAnalyzer()
+    reference = [analyzer.evidence(text, 'naive') for text in texts]
+    for engine in ENGINES[1:]:
+        if [analyzer.evidence(text, engine) for text in texts] != reference:
+            raise AssertionError(f"Lexicon engine '{engine}' disagrees with the per-rule matching")
+    if analyzer.evidence_batch(texts) != reference:
+        raise AssertionError("Batched lexicon automaton disagrees with the per-rule matching")
+
+    results = {}
+    for engine in ENGINES:
+        results[f'lexicon.{engine}'] = measure(
+            lambda: [analyzer.evidence(text, engine) for text in texts], items=len(texts)
+        )
+    results['lexicon.automaton_batch'] = measure(lambda: analyzer.evidence_batch(texts), items=len(texts))
+    return results
+
+def available_backends(model_type, backends):
+    """The requested backends whose artifacts exist for this model"""
+    return [
+        backend for backend in backends
+        if backend_artifact(model_type, backend).exists()
+    ]
+
+def run_all(models=('cnn', 'lstm'), backends=('torch', 'torchscript'), batch_sizes=BATCH_SIZES,
+            corpus_size=1024, endpoint=True, endpoint_requests=200, lexicon=True):
+    """Run every stage and return {benchmark name: stats}"""
+    preprocessor = TextPreprocessor.load(PREPROCESSOR_PATH)
+    vocab_size = len(preprocessor.word2idx)
+    texts = load_corpus(size=corpus_size)
+    X = preprocessor.texts_to_tensor(texts)
+
+    results = {}
+    print("Tokenization...")
+    results.update(bench_tokenize(preprocessor, texts))
+
+    logits = None
+    for model_type in models:
+        for backend_name in available_backends(model_type, backends):
+            print(f"Forward pass: {model_type} ({backend_name})...")
+            backend = load_backend(model_type, backend_name, vocab_size=vocab_size)
+            results.update(bench_forward(backend, X, batch_sizes))
+            if logits is None:
+                logits = backend.logits(X)
+
+    if logits is not None:
+        print("Postprocessing...")
+        results.update(bench_postprocess(preprocessor, logits))
+
+    if lexicon:
+        print("Lexicon rules...")
+        results.update(bench_lexicon(texts))
+
+    if endpoint:
+        print("End-to-end /predict...")
+        results.update(bench_endpoint(texts, endpoint_requests))
+    return results
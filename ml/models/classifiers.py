@@ -1,3 +1,4 @@
+import warnings
 import torch
 import torch.nn as nn
 
@@ -23,9 +24,21 @@ class CNNTextClassifier(nn.Module):
         self.fc1 = nn.Linear(128 * 3, 128)  # 3 conv layers
         self.dropout2 = nn.Dropout(0.5)
         self.fc2 = nn.Linear(128, num_classes)
+    
+    @property
+    def pad_margin(self):
+        """
+        Trailing <PAD> positions a batch needs past its longest sequence for
+        the max pooling to equal the result at full max_seq_len padding.
+        A window past the real tokens only depends on how many <PAD> and
+        conv zero-padding positions it covers, so with kernel_size <PAD>s
+        after the last token, more padding adds no new window values.
+        """
+        return max(conv.kernel_size[0] for conv in (self.conv1, self.conv2, self.conv3))
         
-    def forward(self, x):
-        # x shape: (batch_size, seq_len)
+    def forward(self, x, lengths=None):
+        # x shape: (batch_size, seq_len); lengths is unused, padding only
+        # needs to be at least pad_margin past the longest sequence
         embedded = self.embedding(x)  # (batch_size, seq_len, embedding_dim)
         embedded = embedded.permute(0, 2, 1)  # (batch_size, embedding_dim, seq_len)
         
@@ -50,6 +63,91 @@ class CNNTextClassifier(nn.Module):
         
         return output
 
+class FusedCNNTextClassifier(nn.Module):
+    """
+    Inference-only CNNTextClassifier with the embedding and the three conv
+    branches folded into one lookup table. A conv output is its bias plus
+    one kernel tap per window position applied to an embedding row, so
+    table[k, token] holds every channel's tap k applied to that token's
+    embedding, precomputed over the whole (small) vocabulary. The forward
+    pass is then a single embedding_bag sum over each window instead of an
+    embedding lookup and three convolutions. Bias and ReLU are applied after
+    the max pooling, which gives the same result since both are monotonic.
+    Matches the source model in eval mode up to float rounding.
+    """
+    def __init__(self, model):
+        super(FusedCNNTextClassifier, self).__init__()
+        convs = [model.conv1, model.conv2, model.conv3]
+        left = max(conv.padding[0] for conv in convs)
+        # Each branch's kernel sits at this offset inside the fused window
+        offsets = [left - conv.padding[0] for conv in convs]
+        kernel_size = max(offset + conv.kernel_size[0] for offset, conv in zip(offsets, convs))
+        # Output length of each branch relative to seq_len
+        extra = [2 * conv.padding[0] - conv.kernel_size[0] + 1 for conv in convs]
+        right = max(extra) + kernel_size - 1 - left
+
+        embedding = model.embedding.weight.detach()
+        vocab_size = embedding.size(0)
+        out_channels = sum(conv.out_channels for conv in convs)
+        # Row vocab_size of each tap is the conv's zero padding (<PAD> itself
+        # has a trained, non-zero embedding)
+        table = torch.zeros(kernel_size, vocab_size + 1, out_channels)
+        bias = torch.zeros(out_channels)
+        start = 0
+        for offset, conv in zip(offsets, convs):
+            end = start + conv.out_channels
+            weight = conv.weight.detach()  # (out_channels, embedding_dim, kernel_size)
+            for k in range(conv.kernel_size[0]):
+                table[offset + k, :vocab_size, start:end] = embedding @ weight[:, :, k].t()
+            bias[start:end] = conv.bias.detach()
+            start = end
+
+        self.register_buffer('table', table.reshape(-1, out_channels))
+        self.register_buffer('bias', bias)
+        self.register_buffer('tap_offsets', torch.arange(kernel_size) * (vocab_size + 1))
+        self.padding = [left, right]
+        self.pad_id = vocab_size
+        self.kernel_size = kernel_size
+        self.channels = [conv.out_channels for conv in convs]
+        self.extra = extra
+        self.relu = nn.ReLU()
+        self.fc1 = model.fc1
+        self.fc2 = model.fc2
+        self.eval()
+
+    def forward(self, x):
+        batch_size, seq_len = x.size(0), x.size(1)
+        padded = nn.functional.pad(x, self.padding, value=float(self.pad_id))
+        windows = padded.unfold(1, self.kernel_size, 1) + self.tap_offsets  # (batch, positions, kernel)
+        positions = windows.size(1)
+        conv_out = nn.functional.embedding_bag(
+            windows.reshape(-1, self.kernel_size), self.table, mode='sum'
+        ).view(batch_size, positions, -1)
+
+        pools = []
+        start = 0
+        for i in range(len(self.channels)):
+            end = start + self.channels[i]
+            pools.append(torch.max(conv_out[:, :seq_len + self.extra[i], start:end], dim=1)[0])
+            start = end
+        pooled = self.relu(torch.cat(pools, dim=1) + self.bias)
+
+        return self.fc2(self.relu(self.fc1(pooled)))
+
+def script_model(model):
+    """
+    Frozen TorchScript graph of a trained CNNTextClassifier for serving.
+    The embedding and conv branches are fused first; freezing inlines the
+    weights and drops the training-only ops (dropout).
+    """
+    if not isinstance(model, CNNTextClassifier):
+        # Scripted LSTMs fail to serialize (undefined packed-sequence tensors)
+        raise ValueError(f"TorchScript export only supports CNNTextClassifier, got {model.__class__.__name__}")
+    model.eval()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        return torch.jit.freeze(torch.jit.script(FusedCNNTextClassifier(model)))
+
 class LSTMTextClassifier(nn.Module):
     """
     Bidirectional LSTM for text classification.
@@ -77,11 +175,39 @@ class LSTMTextClassifier(nn.Module):
         self.dropout2 = nn.Dropout(0.5)
         self.fc2 = nn.Linear(64, num_classes)
         
-    def forward(self, x):
+        # Trained on packed sequences (train.py --bucket): <PAD> steps are
+        # always skipped, also when no lengths are given. Saved in the
+        # checkpoint, so every loader runs the model the way it was trained
+        self.packed = False
+        
+    @property
+    def pad_margin(self):
+        # Unpacked, the final hidden states depend on every padded step, so
+        # the model needs the full max_seq_len padding it was trained with
+        return 0 if self.packed else None
+        
+    def get_extra_state(self):
+        return {'packed': self.packed}
+    
+    def set_extra_state(self, state):
+        self.packed = bool(state.get('packed', False))
+    
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Checkpoints from before the flag existed were trained fully padded
+        state_dict.setdefault(prefix + '_extra_state', {'packed': False})
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+        
+    def forward(self, x, lengths=None):
         # x shape: (batch_size, seq_len)
         embedded = self.embedding(x)  # (batch_size, seq_len, embedding_dim)
         
-        # LSTM
+        if lengths is None and self.packed:
+            lengths = (x != 0).sum(dim=1)
+        # LSTM; with lengths, <PAD> steps are skipped via a packed sequence
+        if lengths is not None:
+            embedded = nn.utils.rnn.pack_padded_sequence(
+                embedded, lengths.cpu().clamp(min=1), batch_first=True, enforce_sorted=False
+            )
         lstm_out, (hidden, cell) = self.lstm(embedded)
         
         # Take the output from the last time step
@@ -100,6 +226,30 @@ class LSTMTextClassifier(nn.Module):
         
         return output
 
+# Hyperparameters of the checkpoints in exports/
+MODEL_CONFIGS = {
+    'cnn': (CNNTextClassifier, {'embedding_dim': 100, 'num_classes': 4}),
+    'lstm': (LSTMTextClassifier, {'embedding_dim': 100, 'hidden_dim': 64, 'num_classes': 4}),
+}
+
+def build_model(model_type, vocab_size):
+    """Build an untrained model with the same architecture as the exported one"""
+    if model_type not in MODEL_CONFIGS:
+        raise ValueError(f"Unknown model type: {model_type}")
+    model_class, kwargs = MODEL_CONFIGS[model_type]
+    return model_class(vocab_size=vocab_size, **kwargs)
+
+def quantize_model(model):
+    """
+    Post-training dynamic int8 quantization of the Linear and LSTM layers.
+    Weights are stored as int8 and activations are quantized on the fly,
+    so no calibration data is needed. Runs on CPU only.
+    """
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(
+        model, {nn.Linear, nn.LSTM}, dtype=torch.qint8
+    )
+
 if __name__ == "__main__":
     # Test models
     vocab_size = 10000
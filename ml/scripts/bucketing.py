@@ -0,0 +1,80 @@
+import numpy as np
+
+# Helpers for padding batches only as far as their longest item.
+# Real tokens are never 0 (<UNK> is 1), so the length of an encoded row is
+# its number of non-zero ids and all padding sits at the end.
+
+def sequence_lengths(X):
+    """Number of real tokens per row of a padded (n, seq_len) array"""
+    return np.count_nonzero(X, axis=1)
+
+def trim_padding(X, extra=0):
+    """
+    Drop padding columns beyond the longest row plus `extra`.
+    Returns (X_trimmed, lengths). The result is never wider than X.
+    """
+    lengths = sequence_lengths(X)
+    width = min(X.shape[1], max(int(lengths.max(initial=0)) + extra, 1))
+    return np.ascontiguousarray(X[:, :width]), lengths
+
+def bucket_batches(lengths, batch_size, shuffle=False, rng=None, pool_batches=100):
+    """
+    Split indices into batches of similar length.
+    Indices are (optionally) shuffled, cut into pools of pool_batches
+    batches, and sorted by length inside each pool, which keeps some
+    randomness for training while most batches need little padding.
+    """
+    lengths = np.asarray(lengths)
+    order = rng.permutation(len(lengths)) if shuffle else np.arange(len(lengths))
+    pool_size = batch_size * pool_batches
+
+    batches = []
+    for start in range(0, len(order), pool_size):
+        pool = order[start:start + pool_size]
+        pool = pool[np.argsort(lengths[pool], kind='stable')]
+        batches.extend(pool[i:i + batch_size] for i in range(0, len(pool), batch_size))
+
+    if shuffle:
+        batches = [batches[i] for i in rng.permutation(len(batches))]
+    return batches
+
+class LengthBucketSampler:
+    """Batch sampler for DataLoader(batch_sampler=...) built on bucket_batches"""
+    def __init__(self, lengths, batch_size, shuffle=False, seed=0, pool_batches=100):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.pool_batches = pool_batches
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        batches = bucket_batches(self.lengths, self.batch_size, self.shuffle, self.rng, self.pool_batches)
+        for batch in batches:
+            yield batch.tolist()
+
+def predict_proba_bucketed(backend, X, batch_size=256):
+    """
+    Score a padded (n, seq_len) array, in length buckets of batch_size.
+    Backends with a pad_margin get each bucket trimmed to its own longest
+    row; others (fixed-length models) see the full padding as before.
+    Rows come back in the original order.
+    """
+    if backend.pad_margin is None:
+        return np.concatenate([
+            backend.predict_proba(X[start:start + batch_size])
+            for start in range(0, len(X), batch_size)
+        ]) if len(X) else backend.predict_proba(X)
+
+    if len(X) <= batch_size:
+        return backend.predict_proba(trim_padding(X, backend.pad_margin)[0])
+
+    probabilities = None
+    for batch in bucket_batches(sequence_lengths(X), batch_size):
+        probs = backend.predict_proba(trim_padding(X[batch], backend.pad_margin)[0])
+        if probabilities is None:
+            probabilities = np.empty((len(X), probs.shape[1]), dtype=probs.dtype)
+        probabilities[batch] = probs
+    return probabilities
@@ -8,16 +8,52 @@ import json
 sys.path.append(str(Path(__file__).parent.parent))
 from models.classifiers import CNNTextClassifier
 from scripts.prepare_data import TextPreprocessor
+from scripts.memmap_dataset import DEFAULT_DIR as MEMMAP_DIR, HEADER_NAME, MemmapTextDataset
+from serving.backends import TorchBackend, artifact_path
+
+def evaluate_quantized(model_type, X_test, y_test, vocab_size, fp32_predictions=None):
+    """
+    Compare the int8 model (scripts/quantize.py) against fp32 on the test set.
+    fp32_predictions are computed from exports/best_*.pth when not given.
+    """
+    int8_path = artifact_path(model_type, "_int8.pth")
+    fp32_path = artifact_path(model_type, ".pth")
+    if not int8_path.exists() or not fp32_path.exists():
+        print(f"\n(No quantized {model_type} model at {int8_path}, skipping int8 comparison)")
+        return None
+    
+    X = X_test.cpu().numpy()
+    if fp32_predictions is None:
+        fp32_backend = TorchBackend(model_type, vocab_size, device=torch.device('cpu'))
+        fp32_predictions = fp32_backend.logits(X).argmax(axis=1)
+    backend = TorchBackend(model_type, vocab_size, quantized=True)
+    int8_predictions = backend.logits(X).argmax(axis=1)
+    
+    fp32_accuracy = accuracy_score(y_test.numpy(), fp32_predictions)
+    int8_accuracy = accuracy_score(y_test.numpy(), int8_predictions)
+    
+    return {
+        'accuracy': float(int8_accuracy),
+        'accuracy_delta': float(int8_accuracy - fp32_accuracy),
+        'agreement_with_fp32': float(np.mean(int8_predictions == fp32_predictions)),
+        'model_size_kb': {
+            'fp32': round(fp32_path.stat().st_size / 1024, 1),
+            'int8': round(int8_path.stat().st_size / 1024, 1)
+        }
+    }
 
 def evaluate_model():
     """Evaluate model and generate detailed metrics"""
     
     device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
     
-    # Load test data
-    data_path = Path(__file__).parent.parent / "data" / "processed" / "datasets.pt"
-    data = torch.load(data_path)
-    X_test, y_test = data['X_test'], data['y_test']
+    # Load test data (memmap format if present, it opens without unpickling)
+    if (MEMMAP_DIR / HEADER_NAME).exists():
+        X_test, y_test = MemmapTextDataset(MEMMAP_DIR, 'test').tensors()
+    else:
+        data_path = Path(__file__).parent.parent / "data" / "processed" / "datasets.pt"
+        data = torch.load(data_path)
+        X_test, y_test = data['X_test'], data['y_test']
     
     # Load preprocessor
     preprocessor_path = Path(__file__).parent.parent / "data" / "processed" / "preprocessor.pkl"
@@ -93,6 +129,15 @@ def evaluate_model():
         'confusion_matrix': cm.tolist()
     }
     
+    # Both int8 artifacts can be served (MODEL_QUANTIZED=1), so both are checked
+    quantized = {}
+    for model_type, fp32_predictions in (('cnn', all_predictions), ('lstm', None)):
+        result = evaluate_quantized(model_type, X_test, y_test, vocab_size, fp32_predictions)
+        if result is not None:
+            quantized[model_type] = result
+    if quantized:
+        metrics['quantized_int8'] = quantized
+    
     # Save to file
     output_path = Path(__file__).parent.parent / "exports" / "model_metrics.json"
     with open(output_path, 'w', encoding='utf-8') as f:
@@ -122,6 +167,15 @@ def evaluate_model():
     for i, row in enumerate(cm):
         print(f"{target_names[i]:10}", "  ".join([f"{val:^10}" for val in row]))
     
+    for model_type, result in quantized.items():
+        print("\n" + "-"*70)
+        print(f"Modelo Cuantizado (int8 dinámico) - {model_type.upper()}:")
+        print("-"*70)
+        print(f"  Accuracy int8:       {result['accuracy']*100:.2f}%")
+        print(f"  Diferencia vs fp32:  {result['accuracy_delta']*100:+.2f} pts")
+        print(f"  Coincidencia fp32:   {result['agreement_with_fp32']*100:.2f}%")
+        print(f"  Tamaño: {result['model_size_kb']['fp32']} KB → {result['model_size_kb']['int8']} KB")
+    
     print("\n✓ Métricas guardadas en:", output_path)
     
     return metrics
@@ -0,0 +1,89 @@
+import torch
+import numpy as np
+from pathlib import Path
+import argparse
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from models.classifiers import build_model
+from scripts.prepare_data import TextPreprocessor
+from serving.backends import MODEL_NAMES, artifact_path
+
+def export_model(model_type, vocab_size, max_seq_len=50, opset=17):
+    """Export a trained classifier to ONNX with dynamic batch and sequence axes"""
+    model = build_model(model_type, vocab_size)
+    model_path = artifact_path(model_type, ".pth")
+    model.load_state_dict(torch.load(model_path, map_location='cpu'))
+    model.eval()
+    if getattr(model, 'packed', False):
+        # Packed sequences don't export to ONNX, and a fully padded graph
+        # would give other predictions than the checkpoint
+        raise ValueError(
+            f"{model_path.name} was trained on packed sequences (train.py --bucket); "
+            f"serve it with MODEL_BACKEND=torch or retrain without --bucket to export it"
+        )
+
+    onnx_path = artifact_path(model_type, ".onnx")
+    dummy = torch.ones(2, max_seq_len, dtype=torch.long)
+    export_kwargs = dict(
+        input_names=['input_ids'],
+        output_names=['logits'],
+        dynamic_axes={'input_ids': {0: 'batch', 1: 'seq_len'}, 'logits': {0: 'batch'}},
+        opset_version=opset,
+    )
+    try:
+        # Newer torch defaults to the dynamo exporter, which needs onnxscript
+        torch.onnx.export(model, (dummy,), str(onnx_path), dynamo=False, **export_kwargs)
+    except TypeError:
+        torch.onnx.export(model, (dummy,), str(onnx_path), **export_kwargs)
+
+    if getattr(model, 'pad_margin', None) is not None:
+        add_metadata(onnx_path, pad_margin=model.pad_margin)
+    
+    print(f"✓ Exported {MODEL_NAMES[model_type]} to {onnx_path}")
+    verify_export(model, onnx_path, vocab_size, max_seq_len)
+    return onnx_path
+
+def add_metadata(onnx_path, **values):
+    """Store key/value pairs in the ONNX model's metadata_props"""
+    import onnx
+    
+    proto = onnx.load(str(onnx_path))
+    for key, value in values.items():
+        entry = proto.metadata_props.add()
+        entry.key = key
+        entry.value = str(value)
+    onnx.save(proto, str(onnx_path))
+
+def verify_export(model, onnx_path, vocab_size, max_seq_len):
+    """Compare ONNX Runtime logits against PyTorch on a random batch"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("  (onnxruntime not installed, skipping verification)")
+        return
+
+    session = ort.InferenceSession(str(onnx_path), providers=['CPUExecutionProvider'])
+    # Shorter than max_seq_len to exercise the dynamic sequence axis too
+    X = torch.randint(0, vocab_size, (8, max_seq_len // 2))
+
+    with torch.no_grad():
+        expected = model(X).numpy()
+    actual = session.run(None, {'input_ids': X.numpy()})[0]
+
+    max_diff = float(np.abs(expected - actual).max())
+    print(f"  Max |torch - onnx| on a (8, {X.shape[1]}) batch: {max_diff:.2e}")
+    if max_diff > 1e-4:
+        raise RuntimeError(f"ONNX export of {onnx_path.name} does not match PyTorch")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export text classifiers to ONNX")
+    parser.add_argument('models', nargs='*', help=f"Models to export ({', '.join(MODEL_NAMES)}; default: all)")
+    parser.add_argument('--opset', type=int, default=17)
+    args = parser.parse_args()
+
+    preprocessor_path = Path(__file__).parent.parent / "data" / "processed" / "preprocessor.pkl"
+    preprocessor = TextPreprocessor.load(preprocessor_path)
+
+    for model_type in args.models or list(MODEL_NAMES):
+        export_model(model_type, len(preprocessor.word2idx), preprocessor.max_seq_len, args.opset)
@@ -0,0 +1,105 @@
+import json
+import time
+import torch
+import numpy as np
+from pathlib import Path
+import argparse
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from models.classifiers import build_model, script_model
+from scripts.prepare_data import TextPreprocessor
+from serving.backends import MODEL_NAMES, TORCHSCRIPT_METADATA, TorchScriptBackend, artifact_path, backend_artifact
+
+BENCHMARK_BATCH_SIZES = (1, 8, 32, 128, 512)
+
+def load_eager(model_type, vocab_size):
+    model = build_model(model_type, vocab_size)
+    model.load_state_dict(torch.load(artifact_path(model_type, ".pth"), map_location='cpu'))
+    model.eval()
+    return model
+
+def export_model(model_type, vocab_size, max_seq_len=50):
+    """Write the frozen TorchScript graph of a trained classifier (CNN only)"""
+    model = load_eager(model_type, vocab_size)
+    scripted = script_model(model)
+
+    metadata = {'model_type': model_type, 'max_seq_len': max_seq_len}
+    if getattr(model, 'pad_margin', None) is not None:
+        metadata['pad_margin'] = model.pad_margin
+
+    ts_path = backend_artifact(model_type, 'torchscript')
+    torch.jit.save(scripted, str(ts_path), _extra_files={TORCHSCRIPT_METADATA: json.dumps(metadata)})
+
+    print(f"✓ Exported {MODEL_NAMES[model_type]} to {ts_path}")
+    verify_export(model_type, model, ts_path, vocab_size, max_seq_len)
+    return ts_path
+
+def verify_export(model_type, model, ts_path, vocab_size, max_seq_len):
+    """Compare the saved graph against the eager model on a random batch"""
+    scripted = TorchScriptBackend(model_type, model_path=ts_path).model
+    X = torch.randint(0, vocab_size, (8, max_seq_len // 2))
+
+    with torch.no_grad():
+        max_diff = float((model(X) - scripted(X)).abs().max())
+    print(f"  Max |eager - torchscript| on a (8, {X.shape[1]}) batch: {max_diff:.2e}")
+    if max_diff > 1e-4:
+        raise RuntimeError(f"TorchScript export of {ts_path.name} does not match eager PyTorch")
+
+def time_forward(model, X, repeats):
+    """Median seconds per forward pass, after warm-up"""
+    with torch.inference_mode():
+        for _ in range(3):
+            model(X)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(X)
+            times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def benchmark(model_type, vocab_size, seq_len, batch_sizes=BENCHMARK_BATCH_SIZES, repeats=50, compile=False):
+    """Latency per batch size of the eager model vs the TorchScript export"""
+    variants = {
+        'eager': load_eager(model_type, vocab_size),
+        'torchscript': TorchScriptBackend(model_type).model,
+    }
+    if compile:
+        variants['compile'] = torch.compile(load_eager(model_type, vocab_size), dynamic=True)
+
+    print(f"\n{MODEL_NAMES[model_type]} latency (ms per batch, seq_len={seq_len}, "
+          f"{torch.get_num_threads()} threads)")
+    print(f"  {'batch':>6}" + ''.join(f"{name:>14}" for name in variants) + f"{'speedup':>10}")
+
+    results = []
+    for batch_size in batch_sizes:
+        X = torch.randint(1, vocab_size, (batch_size, seq_len))
+        row = {'batch_size': batch_size}
+        for name, model in variants.items():
+            try:
+                row[name] = time_forward(model, X, repeats) * 1000
+            except Exception as e:
+                # torch.compile needs a working compiler toolchain
+                print(f"  ({name} failed: {e.__class__.__name__}: {e})")
+                row[name] = float('nan')
+        speedup = row['eager'] / row['torchscript']
+        print(f"  {batch_size:>6}" + ''.join(f"{row[name]:>14.3f}" for name in variants) + f"{speedup:>9.2f}x")
+        results.append(row)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the CNN classifier as a frozen TorchScript graph")
+    parser.add_argument('--benchmark', action='store_true', help="Compare eager and TorchScript latency per batch size")
+    parser.add_argument('--compile', action='store_true', help="Include torch.compile in the benchmark")
+    parser.add_argument('--seq-len', type=int, default=None, help="Benchmark sequence length (default: max_seq_len)")
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    preprocessor_path = Path(__file__).parent.parent / "data" / "processed" / "preprocessor.pkl"
+    preprocessor = TextPreprocessor.load(preprocessor_path)
+    vocab_size = len(preprocessor.word2idx)
+
+    export_model('cnn', vocab_size, preprocessor.max_seq_len)
+    if args.benchmark:
+        benchmark('cnn', vocab_size, args.seq_len or preprocessor.max_seq_len,
+                  repeats=args.repeats, compile=args.compile)
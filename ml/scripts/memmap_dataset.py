@@ -0,0 +1,197 @@
+import json
+import torch
+import numpy as np
+from pathlib import Path
+from torch.utils.data import Dataset
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+# On-disk layout:
+#   header.json                 dtypes, max_seq_len and the shards of each split
+#   {split}-{n:05d}.tokens.bin  raw (rows, max_seq_len) token ids, C order
+#   {split}-{n:05d}.labels.bin  raw (rows,) label ids
+# Raw arrays (no pickle) can be opened with np.memmap or torch.from_file.
+HEADER_NAME = "header.json"
+FORMAT_VERSION = 1
+TOKEN_DTYPE = np.int32
+LABEL_DTYPE = np.int64
+
+DEFAULT_DIR = Path(__file__).parent.parent / "data" / "processed" / "memmap"
+
+class ShardWriter:
+    """
+    Appends encoded rows of one split to fixed-size shards on disk.
+    Only the shard currently being filled is kept in memory.
+    """
+    def __init__(self, out_dir, split, max_seq_len, shard_rows=1_000_000):
+        self.out_dir = Path(out_dir)
+        self.split = split
+        self.max_seq_len = max_seq_len
+        self.shard_rows = shard_rows
+        self.shards = []
+        self._tokens = np.zeros((shard_rows, max_seq_len), dtype=TOKEN_DTYPE)
+        self._labels = np.zeros(shard_rows, dtype=LABEL_DTYPE)
+        self._fill = 0
+
+    @property
+    def rows(self):
+        return sum(shard['rows'] for shard in self.shards) + self._fill
+
+    def write(self, tokens, labels):
+        """Append a (n, max_seq_len) token block and its (n,) labels"""
+        start = 0
+        while start < len(tokens):
+            take = min(len(tokens) - start, self.shard_rows - self._fill)
+            self._tokens[self._fill:self._fill + take] = tokens[start:start + take]
+            self._labels[self._fill:self._fill + take] = labels[start:start + take]
+            self._fill += take
+            start += take
+            if self._fill == self.shard_rows:
+                self.flush()
+
+    def flush(self):
+        """Write the pending rows as a new shard"""
+        if self._fill == 0:
+            return
+        name = f"{self.split}-{len(self.shards):05d}"
+        self._tokens[:self._fill].tofile(self.out_dir / f"{name}.tokens.bin")
+        self._labels[:self._fill].tofile(self.out_dir / f"{name}.labels.bin")
+        self.shards.append({
+            'tokens': f"{name}.tokens.bin",
+            'labels': f"{name}.labels.bin",
+            'rows': self._fill
+        })
+        self._fill = 0
+
+def write_header(out_dir, writers, max_seq_len, **extra):
+    """Write header.json describing every split written by the given ShardWriters"""
+    header = {
+        'format_version': FORMAT_VERSION,
+        'token_dtype': np.dtype(TOKEN_DTYPE).name,
+        'label_dtype': np.dtype(LABEL_DTYPE).name,
+        'max_seq_len': max_seq_len,
+        'splits': {writer.split: writer.shards for writer in writers},
+        **extra
+    }
+    path = Path(out_dir) / HEADER_NAME
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(header, f, indent=2, ensure_ascii=False)
+    return path
+
+def write_arrays(out_dir, splits, max_seq_len, **extra):
+    """Write in-memory {split: (tokens, labels)} arrays as one shard per split"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    writers = []
+    for split, (tokens, labels) in splits.items():
+        writer = ShardWriter(out_dir, split, max_seq_len, shard_rows=max(len(tokens), 1))
+        writer.write(np.asarray(tokens), np.asarray(labels))
+        writer.flush()
+        writers.append(writer)
+    return write_header(out_dir, writers, max_seq_len, **extra)
+
+def read_header(data_dir):
+    with open(Path(data_dir) / HEADER_NAME, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class MemmapTextDataset(Dataset):
+    """
+    One split of the on-disk format above, read through np.memmap.
+    Opening is instant and DataLoader workers share the OS page cache
+    instead of each holding a copy of the data.
+    """
+    def __init__(self, data_dir, split):
+        self.data_dir = Path(data_dir)
+        self.split = split
+        self.header = read_header(self.data_dir)
+        self.max_seq_len = self.header['max_seq_len']
+        self.shards = [shard for shard in self.header['splits'][split] if shard['rows'] > 0]
+        # offsets[i] is the global index of the first row of shard i
+        self.offsets = np.cumsum([0] + [shard['rows'] for shard in self.shards])
+        self._arrays = None
+
+    def _open(self):
+        token_dtype = np.dtype(self.header['token_dtype'])
+        label_dtype = np.dtype(self.header['label_dtype'])
+        self._arrays = [
+            (
+                np.memmap(self.data_dir / shard['tokens'], dtype=token_dtype, mode='r',
+                          shape=(shard['rows'], self.max_seq_len)),
+                np.memmap(self.data_dir / shard['labels'], dtype=label_dtype, mode='r',
+                          shape=(shard['rows'],))
+            )
+            for shard in self.shards
+        ]
+
+    @property
+    def arrays(self):
+        if self._arrays is None:
+            self._open()
+        return self._arrays
+
+    def __getstate__(self):
+        # Worker processes reopen the files instead of pickling mapped data
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        shard = int(np.searchsorted(self.offsets, idx, side='right')) - 1
+        tokens, labels = self.arrays[shard]
+        row = idx - self.offsets[shard]
+        return (
+            torch.from_numpy(tokens[row].astype(np.int64)),
+            torch.tensor(labels[row], dtype=torch.long)
+        )
+
+    def __getitems__(self, indices):
+        """Batched fetch used by DataLoader: one fancy-index read per shard"""
+        indices = np.asarray(indices)
+        shards = np.searchsorted(self.offsets, indices, side='right') - 1
+        X = np.empty((len(indices), self.max_seq_len), dtype=np.int64)
+        y = np.empty(len(indices), dtype=np.int64)
+        for shard in np.unique(shards):
+            mask = shards == shard
+            tokens, labels = self.arrays[shard]
+            rows = indices[mask] - self.offsets[shard]
+            X[mask] = tokens[rows]
+            y[mask] = labels[rows]
+        return list(zip(torch.from_numpy(X), torch.from_numpy(y)))
+
+    def lengths(self):
+        """Number of real (non-<PAD>) tokens of every row"""
+        if not self.arrays:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.count_nonzero(tokens, axis=1) for tokens, _ in self.arrays])
+
+    def tensors(self):
+        """Whole split as (X, y) long tensors, for evaluation in one pass"""
+        X = np.concatenate([tokens for tokens, _ in self.arrays]) if self.arrays else np.zeros((0, self.max_seq_len))
+        y = np.concatenate([labels for _, labels in self.arrays]) if self.arrays else np.zeros(0)
+        return torch.from_numpy(X.astype(np.int64)), torch.from_numpy(y.astype(np.int64))
+
+def convert_datasets_pt(data_path, out_dir=DEFAULT_DIR, vocab_size=None):
+    """Convert an existing datasets.pt into the memmap format"""
+    data = torch.load(data_path)
+    splits = {
+        split: (data[f'X_{split}'].numpy(), data[f'y_{split}'].numpy())
+        for split in ('train', 'val', 'test')
+    }
+    max_seq_len = splits['train'][0].shape[1]
+    extra = {'vocab_size': vocab_size} if vocab_size else {}
+    path = write_arrays(out_dir, splits, max_seq_len, **extra)
+    print(f"✓ Wrote memmap dataset to {Path(out_dir)} ({path.name})")
+    return path
+
+if __name__ == "__main__":
+    from scripts.prepare_data import TextPreprocessor
+
+    processed_dir = Path(__file__).parent.parent / "data" / "processed"
+    preprocessor = TextPreprocessor.load(processed_dir / "preprocessor.pkl")
+    convert_datasets_pt(processed_dir / "datasets.pt", vocab_size=len(preprocessor.word2idx))
@@ -1,53 +1,87 @@
-import torch
+import argparse
+import threading
 import sys
 from pathlib import Path
 
 # Add paths
 sys.path.append(str(Path(__file__).parent.parent))
-from models.classifiers import CNNTextClassifier, LSTMTextClassifier
 from scripts.prepare_data import TextPreprocessor
+from scripts.bucketing import predict_proba_bucketed
+from serving.backends import BACKENDS, backend_artifact, load_backend
 
-def predict(text, model_type='cnn'):
-    """Predict emotion from text"""
-    device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
-    
-    # Load preprocessor
-    preprocessor_path = Path(__file__).parent.parent / "data" / "processed" / "preprocessor.pkl"
-    preprocessor = TextPreprocessor.load(preprocessor_path)
-    
-    # Load model
-    vocab_size = len(preprocessor.word2idx)
-    
-    if model_type == 'cnn':
-        model = CNNTextClassifier(vocab_size=vocab_size, embedding_dim=100, num_classes=4)
-        model_path = Path(__file__).parent.parent / "exports" / "best_CNNTextClassifier.pth"
-    else:
-        model = LSTMTextClassifier(vocab_size=vocab_size, embedding_dim=100, hidden_dim=64, num_classes=4)
-        model_path = Path(__file__).parent.parent / "exports" / "best_LSTMTextClassifier.pth"
-    
-    model.load_state_dict(torch.load(model_path))
-    model = model.to(device)
-    model.eval()
+PREPROCESSOR_PATH = Path(__file__).parent.parent / "data" / "processed" / "preprocessor.pkl"
+
+class Predictor:
+    """
+    Holds the preprocessor and a loaded model so they are deserialized
+    once and reused across calls. Use get_predictor() to share instances.
+    """
+    def __init__(self, model_type='cnn', backend='torch', quantized=False, num_threads=None):
+        self.model_type = model_type
+        self.backend = backend
+        self.quantized = quantized
+        self.artifact_path = backend_artifact(model_type, backend, quantized)
+        self.mtimes = artifact_mtimes(self.artifact_path)
+        
+        self.preprocessor = TextPreprocessor.load(PREPROCESSOR_PATH)
+        vocab_size = len(self.preprocessor.word2idx)
+        self.model = load_backend(model_type, backend, vocab_size=vocab_size, quantized=quantized,
+                                  num_threads=num_threads)
     
-    # Preprocess
-    sequence = preprocessor.text_to_sequence(text)
-    X = torch.tensor([sequence], dtype=torch.long).to(device)
+    def predict_proba(self, texts, batch_size=256):
+        """Probabilities for a list of texts, shape (len(texts), num_classes)"""
+        X = self.preprocessor.texts_to_tensor(texts)
+        return predict_proba_bucketed(self.model, X, batch_size)
     
-    # Predict
-    with torch.no_grad():
-        outputs = model(X)
-        probabilities = torch.nn.functional.softmax(outputs, dim=1)
-        confidence, predicted = torch.max(probabilities, 1)
+    def predict_many(self, texts, batch_size=256, chunk_size=100_000):
+        """Predict emotions for many texts, batched by length, batch_size texts per forward pass"""
+        results = []
+        for start in range(0, len(texts), chunk_size):
+            probabilities = self.predict_proba(texts[start:start + chunk_size], batch_size)
+            results.extend(self._format(row) for row in probabilities)
+        return results
     
-    emotion = preprocessor.idx2label[predicted.item()]
-    conf = confidence.item() * 100
+    def predict(self, text):
+        """Predict emotion from one text"""
+        return self.predict_many([text])[0]
     
-    # Get all probabilities
-    all_probs = {preprocessor.idx2label[i]: probabilities[0][i].item() * 100 for i in range(4)}
+    def _format(self, probabilities):
+        predicted = int(probabilities.argmax())
+        emotion = self.preprocessor.idx2label[predicted]
+        conf = float(probabilities[predicted]) * 100
+        all_probs = {self.preprocessor.idx2label[i]: float(probabilities[i]) * 100 for i in range(4)}
+        return emotion, conf, all_probs
+
+def artifact_mtimes(model_path):
+    """Modification times that invalidate a cached Predictor"""
+    return (Path(model_path).stat().st_mtime_ns, PREPROCESSOR_PATH.stat().st_mtime_ns)
+
+_predictors = {}
+_predictors_lock = threading.Lock()
+
+def get_predictor(model_type='cnn', backend='torch', quantized=False):
+    """Return a shared Predictor, reloading it if its artifacts changed on disk"""
+    key = (model_type, backend, quantized)
+    mtimes = artifact_mtimes(backend_artifact(model_type, backend, quantized))
     
-    return emotion, conf, all_probs
+    with _predictors_lock:
+        predictor = _predictors.get(key)
+        if predictor is None or predictor.mtimes != mtimes:
+            predictor = Predictor(model_type, backend, quantized)
+            _predictors[key] = predictor
+    return predictor
+
+def predict(text, model_type='cnn', backend='torch', quantized=False):
+    """Predict emotion from text"""
+    return get_predictor(model_type, backend, quantized).predict(text)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict emotions for sample sentences")
+    parser.add_argument('--model', default='cnn', choices=['cnn', 'lstm'])
+    parser.add_argument('--backend', default='torch', choices=list(BACKENDS))
+    parser.add_argument('--quantized', action='store_true', help="Use the int8 model from scripts/quantize.py")
+    args = parser.parse_args()
+    
     # Test sentences
     test_sentences = [
         "Estoy muy feliz con esta noticia",
@@ -61,11 +95,12 @@ if __name__ == "__main__":
     ]
     
     print("\\n" + "="*70)
-    print("PREDICCIONES CON CNN")
+    print(f"PREDICCIONES CON {args.model.upper()} ({args.backend})")
     print("="*70 + "\\n")
     
-    for sentence in test_sentences:
-        emotion, conf, probs = predict(sentence, 'cnn')
+    predictor = get_predictor(args.model, args.backend, args.quantized)
+    
+    for sentence, (emotion, conf, probs) in zip(test_sentences, predictor.predict_many(test_sentences)):
         print(f"Texto: '{sentence}'")
         print(f"  → Emoción: {emotion.upper()} (confianza: {conf:.1f}%)")
         print(f"  → Probabilidades: {', '.join([f'{k}: {v:.1f}%' for k, v in probs.items()])}")
@@ -1,11 +1,15 @@
 import json
-import torch
+import hashlib
+import argparse
 import numpy as np
-import pandas as pd
 from pathlib import Path
-from sklearn.model_selection import train_test_split
 from collections import Counter
+from itertools import repeat
+from multiprocessing import Pool
 import pickle
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
 
 class TextPreprocessor:
     """Preprocessor for text data: tokenization, vocabulary, encoding"""
@@ -25,8 +29,11 @@ class TextPreprocessor:
             words = text.lower().split()
             all_words.extend(words)
         
-        # Count and get most common
-        word_counts = Counter(all_words)
+        self.build_vocab_from_counts(Counter(all_words))
+    
+    def build_vocab_from_counts(self, word_counts):
+        """Build vocabulary from a Counter (or BoundedCounter) of words"""
+        # Get most common
         most_common = word_counts.most_common(self.vocab_size - 2)  # -2 for PAD and UNK
         
         # Build vocab
@@ -49,6 +56,28 @@ class TextPreprocessor:
         
         return sequence
     
+    def texts_to_tensor(self, texts, num_workers=0, chunk_size=20000, dtype=np.int64):
+        """
+        Encode a batch of texts into a (len(texts), max_seq_len) int64 array.
+        Same tokens as text_to_sequence, but each row is written straight into
+        one preallocated buffer. Use torch.from_numpy() for a zero-copy tensor.
+        With num_workers > 1, large batches are encoded in worker processes.
+        """
+        if not isinstance(texts, (list, tuple)):
+            texts = list(texts)
+        
+        out = np.zeros((len(texts), self.max_seq_len), dtype=dtype)
+        
+        if num_workers > 1 and len(texts) > chunk_size:
+            chunks = ((start, texts[start:start + chunk_size]) for start in range(0, len(texts), chunk_size))
+            with Pool(num_workers, initializer=_init_encoder, initargs=(self.word2idx, self.max_seq_len)) as pool:
+                for start, block in pool.imap_unordered(_encode_chunk, chunks):
+                    out[start:start + len(block)] = block
+        else:
+            encode_into(out, texts, self.word2idx, self.max_seq_len)
+        
+        return out
+    
     def save(self, path):
         """Save preprocessor"""
         data = {
@@ -77,8 +106,36 @@ class TextPreprocessor:
         
         return preprocessor
 
+def encode_into(out, texts, word2idx, max_seq_len):
+    """Write the token ids of each text into the matching row of out (pre-zeroed = <PAD>)"""
+    get = word2idx.get
+    for row, text in zip(out, texts):
+        # Splitting at most max_seq_len times keeps long texts cheap
+        words = text.lower().split(None, max_seq_len)[:max_seq_len]
+        n = len(words)
+        if n:
+            row[:n] = np.fromiter(map(get, words, repeat(1)), dtype=out.dtype, count=n)  # 1 is UNK
+
+# Per-process state for TextPreprocessor.texts_to_tensor workers
+_worker_vocab = None
+
+def _init_encoder(word2idx, max_seq_len):
+    global _worker_vocab
+    _worker_vocab = (word2idx, max_seq_len)
+
+def _encode_chunk(args):
+    start, texts = args
+    word2idx, max_seq_len = _worker_vocab
+    block = np.zeros((len(texts), max_seq_len), dtype=np.int64)  # workers always return int64
+    encode_into(block, texts, word2idx, max_seq_len)
+    return start, block
+
 def load_and_prepare_data():
     """Load dataset and prepare train/val/test splits"""
+    # Imported here so the API can use TextPreprocessor without torch/pandas
+    import torch
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
     
     # Load synthetic dataset
     data_path = Path(__file__).parent.parent / "data" / "raw" / "synthetic_dataset.json"
@@ -114,9 +171,9 @@ def load_and_prepare_data():
     
     # Encode data
     def encode_data(df_split):
-        X = [preprocessor.text_to_sequence(text) for text in df_split['text']]
-        y = [preprocessor.label2idx[label] for label in df_split['emotion']]
-        return torch.tensor(X, dtype=torch.long), torch.tensor(y, dtype=torch.long)
+        X = preprocessor.texts_to_tensor(df_split['text'].tolist())
+        y = df_split['emotion'].map(preprocessor.label2idx).to_numpy(dtype=np.int64)
+        return torch.from_numpy(X), torch.from_numpy(y)
     
     X_train, y_train = encode_data(train)
     X_val, y_val = encode_data(val)
@@ -137,9 +194,154 @@ def load_and_prepare_data():
     
     preprocessor.save(processed_dir / "preprocessor.pkl")
     
+    # Same splits as raw memmap-able arrays for train.py / evaluate_metrics.py
+    from scripts.memmap_dataset import write_arrays
+    write_arrays(processed_dir / "memmap", {
+        'train': (X_train.numpy(), y_train.numpy()),
+        'val': (X_val.numpy(), y_val.numpy()),
+        'test': (X_test.numpy(), y_test.numpy())
+    }, preprocessor.max_seq_len, vocab_size=len(preprocessor.word2idx))
+    
     print(f"\n✓ Saved processed data to {processed_dir}")
     
     return preprocessor
 
+class BoundedCounter:
+    """
+    Word counter with bounded memory for corpora with huge vocabularies.
+    When more than `capacity` distinct words are tracked, the rarest half
+    is dropped. Frequent words survive pruning, so most_common(k) for
+    k well below capacity matches an exact Counter on realistic text.
+    """
+    def __init__(self, capacity=1_000_000):
+        self.capacity = capacity
+        self.counts = Counter()
+        self.pruned = 0
+    
+    def update(self, words):
+        self.counts.update(words)
+        if len(self.counts) > self.capacity:
+            self.counts = Counter(dict(self.counts.most_common(self.capacity // 2)))
+            self.pruned += 1
+    
+    def most_common(self, n=None):
+        return self.counts.most_common(n)
+
+# Hash-based split boundaries, roughly the same 70/15/15 as load_and_prepare_data
+SPLIT_FRACTIONS = (('train', 0.70), ('val', 0.85), ('test', 1.0))
+
+def split_for(text):
+    """Deterministic train/val/test assignment from a hash of the text"""
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    position = int.from_bytes(digest, 'big') / 2**64
+    for split, upper in SPLIT_FRACTIONS:
+        if position < upper:
+            return split
+    return 'test'
+
+def iter_records(path):
+    """Yield {'text', 'emotion'} records from a JSONL file, one line at a time"""
+    path = Path(path)
+    if path.suffix == '.json':
+        # Plain JSON arrays (like synthetic_dataset.json) have to be loaded whole
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_chunks(path, label2idx, chunk_size):
+    """Yield (texts, labels, splits) lists of up to chunk_size valid records"""
+    texts, labels, splits = [], [], []
+    for record in iter_records(path):
+        label = label2idx.get(record.get('emotion'))
+        text = record.get('text')
+        if label is None or not isinstance(text, str):
+            continue
+        texts.append(text)
+        labels.append(label)
+        splits.append(split_for(text))
+        if len(texts) == chunk_size:
+            yield texts, labels, splits
+            texts, labels, splits = [], [], []
+    if texts:
+        yield texts, labels, splits
+
+def prepare_streaming(input_path, output_dir, vocab_size=10000, max_seq_len=50,
+                      shard_rows=1_000_000, chunk_size=50_000, counter_capacity=1_000_000):
+    """
+    Prepare a JSONL corpus that does not fit in memory.
+    Pass 1 builds the vocabulary from the train split with a BoundedCounter;
+    pass 2 encodes chunk by chunk into int32 shards (see memmap_dataset.py).
+    """
+    from scripts.memmap_dataset import ShardWriter, write_header
+    
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    preprocessor = TextPreprocessor(vocab_size=vocab_size, max_seq_len=max_seq_len)
+    
+    # Pass 1: vocabulary from training records only
+    counter = BoundedCounter(counter_capacity)
+    seen = 0
+    for texts, _, splits in iter_chunks(input_path, preprocessor.label2idx, chunk_size):
+        for text, split in zip(texts, splits):
+            if split == 'train':
+                counter.update(text.lower().split())
+        seen += len(texts)
+    print(f"✓ Scanned {seen} records")
+    if counter.pruned:
+        print(f"  (vocabulary counter pruned {counter.pruned} times, capacity {counter_capacity})")
+    preprocessor.build_vocab_from_counts(counter)
+    
+    # Pass 2: encode and write shards
+    writers = {split: ShardWriter(output_dir, split, max_seq_len, shard_rows) for split, _ in SPLIT_FRACTIONS}
+    for texts, labels, splits in iter_chunks(input_path, preprocessor.label2idx, chunk_size):
+        tokens = preprocessor.texts_to_tensor(texts, dtype=np.int32)
+        labels = np.asarray(labels, dtype=np.int64)
+        splits = np.asarray(splits)
+        for split, writer in writers.items():
+            mask = splits == split
+            if mask.any():
+                writer.write(tokens[mask], labels[mask])
+    
+    for writer in writers.values():
+        writer.flush()
+    
+    write_header(
+        output_dir, writers.values(), max_seq_len,
+        vocab_size=len(preprocessor.word2idx),
+        label2idx=preprocessor.label2idx
+    )
+    preprocessor.save(output_dir / "preprocessor.pkl")
+    
+    print("\nSplits:")
+    for split, writer in writers.items():
+        print(f"  {split.capitalize():6} {writer.rows} ({len(writer.shards)} shards)")
+    print(f"\n✓ Saved sharded data to {output_dir}")
+    
+    return preprocessor
+
 if __name__ == "__main__":
-    load_and_prepare_data()
+    parser = argparse.ArgumentParser(description="Prepare train/val/test data")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream a JSONL corpus into int32 shards instead of datasets.pt")
+    parser.add_argument('--input', default=str(Path(__file__).parent.parent / "data" / "raw" / "synthetic_dataset.json"))
+    parser.add_argument('--output', default=str(Path(__file__).parent.parent / "data" / "processed" / "stream"))
+    parser.add_argument('--shard-rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    parser.add_argument('--counter-capacity', type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    if args.stream:
+        prepare_streaming(
+            args.input, args.output,
+            shard_rows=args.shard_rows,
+            chunk_size=args.chunk_size,
+            counter_capacity=args.counter_capacity
+        )
+    else:
+        load_and_prepare_data()
@@ -0,0 +1,36 @@
+import torch
+from pathlib import Path
+import argparse
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from models.classifiers import build_model, quantize_model
+from scripts.prepare_data import TextPreprocessor
+from serving.backends import MODEL_NAMES, artifact_path
+
+def quantize(model_type, vocab_size):
+    """Write exports/best_*_int8.pth from the fp32 checkpoint"""
+    model_path = artifact_path(model_type, ".pth")
+    model = build_model(model_type, vocab_size)
+    model.load_state_dict(torch.load(model_path, map_location='cpu'))
+
+    quantized = quantize_model(model)
+    output_path = artifact_path(model_type, "_int8.pth")
+    torch.save(quantized.state_dict(), output_path)
+
+    fp32_size = model_path.stat().st_size / 1024
+    int8_size = output_path.stat().st_size / 1024
+    print(f"✓ {MODEL_NAMES[model_type]}: {fp32_size:.0f} KB (fp32) → {int8_size:.0f} KB (int8)")
+    print(f"  Saved to {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dynamic int8 quantization of the text classifiers")
+    parser.add_argument('models', nargs='*', help=f"Models to quantize ({', '.join(MODEL_NAMES)}; default: all)")
+    args = parser.parse_args()
+
+    preprocessor_path = Path(__file__).parent.parent / "data" / "processed" / "preprocessor.pkl"
+    preprocessor = TextPreprocessor.load(preprocessor_path)
+
+    for model_type in args.models or list(MODEL_NAMES):
+        quantize(model_type, len(preprocessor.word2idx))
@@ -0,0 +1,329 @@
+import os
+import csv
+import json
+import time
+import shutil
+import argparse
+import sys
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+sys.path.append(str(Path(__file__).parent.parent))
+from scripts.predict import PREPROCESSOR_PATH, Predictor
+from scripts.prepare_data import TextPreprocessor
+from serving.backends import BACKENDS, backend_artifact
+from serving.cache import artifact_hash
+from serving.documents import SEGMENT_MODES, score_documents
+from serving.lexicon import LEXICON_PATH, PATTERNS_PATH, LexiconAnalyzer
+
+# Output layout:
+#   part-{chunk:06d}.jsonl|.parquet  scores of input records [chunk * chunk_size, ...)
+#   _checkpoint.json                 run settings and the chunks already written
+#   _SUCCESS                         written once every chunk is done
+# A part file only appears (atomic rename) once its chunk is fully scored,
+# so after a crash the run restarts at the first chunk missing from the checkpoint.
+CHECKPOINT_NAME = "_checkpoint.json"
+SUCCESS_NAME = "_SUCCESS"
+OUTPUT_FORMATS = ('jsonl', 'parquet')
+RULE_FIELDS = ('classification', 'score', 'emotions', 'intensity', 'keywords', 'isAlert', 'confidence')
+
+def input_format(path):
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if suffix in ('.csv', '.txt'):
+        return suffix[1:]
+    raise ValueError(f"Unsupported input format: {path} (expected .jsonl, .ndjson, .csv or .txt)")
+
+def iter_raw_records(path, fmt):
+    """
+    Yield input records without decoding them: JSONL and text lines stay
+    strings (workers parse them), CSV rows come out as dicts.
+    """
+    with open(path, 'r', encoding='utf-8', newline='' if fmt == 'csv' else None) as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.rstrip('\n')
+            if line.strip():
+                yield line
+
+def iter_chunks(path, fmt, chunk_size, skip=()):
+    """Yield (chunk_id, first_row, records); records is None for chunks in skip"""
+    chunk_id = 0
+    records = []
+    count = 0
+    for record in iter_raw_records(path, fmt):
+        count += 1
+        if chunk_id not in skip:
+            records.append(record)
+        if count == chunk_size:
+            yield chunk_id, chunk_id * chunk_size, None if chunk_id in skip else records
+            chunk_id += 1
+            records = []
+            count = 0
+    if count:
+        yield chunk_id, chunk_id * chunk_size, None if chunk_id in skip else records
+
+# ============= WORKERS =============
+
+_predictor = None
+_analyzer = None
+
+def _init_worker(model_type, backend, quantized, num_threads, rules=False):
+    """Load the model (and the lexicon rules) once per worker process"""
+    global _predictor, _analyzer
+    _predictor = Predictor(model_type, backend, quantized, num_threads=num_threads)
+    if rules:
+        _analyzer = LexiconAnalyzer()
+
+def _parse(record, fmt, text_field, id_field):
+    """(id, text) of one raw record"""
+    if fmt == 'txt':
+        return None, record
+    if fmt == 'jsonl':
+        record = json.loads(record)
+    text = record.get(text_field)
+    if not isinstance(text, str):
+        raise ValueError(f"missing '{text_field}'")
+    return record.get(id_field) if id_field else None, text
+
+def _prediction(labels, probs):
+    predicted = int(probs.argmax())
+    return {
+        'emotion': labels[predicted],
+        'confidence': float(probs[predicted]),
+        'probabilities': {labels[i]: float(p) for i, p in enumerate(probs)},
+    }
+
+def _rule_features(analysis):
+    """Fields of the lexicon analysis kept in the output ('explanation' just restates them)"""
+    if analysis is None:
+        return None
+    return {key: analysis[key] for key in RULE_FIELDS}
+
+def score_records(predictor, records, first_row, fmt, text_field='text', id_field=None, batch_size=1024,
+                  document=None, analyzer=None):
+    """
+    Output rows for a list of raw records; unparseable ones get an 'error' row.
+    document=(mode, window, stride) scores long texts by segments (see
+    serving/documents.py): rows get the document prediction plus 'segments'.
+    With a LexiconAnalyzer, rows also get the frontend's rule analysis of the
+    whole text as 'rules', matched for the whole chunk at once.
+    """
+    parsed = []
+    rows = []
+    for offset, record in enumerate(records):
+        row = {'row': first_row + offset}
+        try:
+            record_id, text = _parse(record, fmt, text_field, id_field)
+        except (ValueError, AttributeError) as e:
+            row['error'] = str(e)
+        else:
+            if id_field:
+                row['id'] = record_id
+            parsed.append((len(rows), text))
+        rows.append(row)
+
+    if not parsed:
+        return rows
+    labels = predictor.preprocessor.idx2label
+    texts = [text for _, text in parsed]
+    if document is None:
+        for (index, _), probs in zip(parsed, predictor.predict_proba(texts, batch_size)):
+            rows[index].update(_prediction(labels, probs))
+    else:
+        # Segments of all records in the chunk share the same batches
+        results = score_documents(lambda segments: predictor.predict_proba(segments, batch_size), texts, *document)
+        for (index, _), (segments, segment_probs, document_probs) in zip(parsed, results):
+            rows[index].update(_prediction(labels, document_probs))
+            rows[index]['segments'] = [
+                {'text': text, 'start': start, 'end': end, **_prediction(labels, probs)}
+                for (text, start, end), probs in zip(segments, segment_probs)
+            ]
+
+    if analyzer is not None:
+        for (index, _), analysis in zip(parsed, analyzer.analyze_batch(texts)):
+            rows[index]['rules'] = _rule_features(analysis)
+    return rows
+
+def write_part(rows, path, out_format):
+    """Write rows to path atomically (temp file + rename)"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    if out_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pylist(rows), tmp_path)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+def _score_chunk(chunk_id, first_row, records, part_path, fmt, out_format, text_field, id_field, batch_size,
+                 document):
+    rows = score_records(_predictor, records, first_row, fmt, text_field, id_field, batch_size, document, _analyzer)
+    write_part(rows, Path(part_path), out_format)
+    return chunk_id, len(rows), sum('error' in row for row in rows)
+
+# ============= CHECKPOINTS =============
+
+def load_checkpoint(output_dir):
+    path = Path(output_dir) / CHECKPOINT_NAME
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(output_dir, checkpoint):
+    path = Path(output_dir) / CHECKPOINT_NAME
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def run_settings(input_path, chunk_size, model_type, backend, quantized, out_format, text_field, id_field,
+                 document=None, rules=False):
+    """What has to stay the same for a run to be resumed"""
+    stat = os.stat(input_path)
+    return {
+        'input': str(Path(input_path).resolve()),
+        'input_size': stat.st_size,
+        'input_mtime_ns': stat.st_mtime_ns,
+        'chunk_size': chunk_size,
+        'model': model_type,
+        'backend': backend,
+        'quantized': quantized,
+        'model_hash': artifact_hash(backend_artifact(model_type, backend, quantized), PREPROCESSOR_PATH),
+        'format': out_format,
+        'text_field': text_field,
+        'id_field': id_field,
+        'document': list(document) if document else None,
+        'rules_hash': artifact_hash(LEXICON_PATH, PATTERNS_PATH) if rules else None,
+    }
+
+def score_bulk(input_path, output_dir, model_type='cnn', backend='torch', quantized=False,
+               workers=None, threads_per_worker=None, chunk_size=50_000, batch_size=1024,
+               out_format='jsonl', text_field='text', id_field=None, overwrite=False, document=None, rules=False):
+    """
+    Score a JSONL/CSV/text file into output_dir, chunk_size records per
+    part file, across worker processes. Resumes an interrupted run.
+    document=(mode, window, stride) scores each text by segments;
+    rules=True adds the lexicon/pattern analysis of each text.
+    """
+    if document is not None:
+        # Tokens past max_seq_len are cut off by the preprocessor, so longer
+        # windows would never have their tail scored
+        _, window, stride = document
+        max_seq_len = TextPreprocessor.load(PREPROCESSOR_PATH).max_seq_len
+        if not 1 <= window <= max_seq_len:
+            raise ValueError(f"--window must be between 1 and the model's max_seq_len ({max_seq_len}), got {window}")
+        if not 1 <= stride <= window:
+            raise ValueError(f"--stride must be between 1 and --window ({window}), got {stride}")
+    
+    fmt = input_format(input_path)
+    output_dir = Path(output_dir)
+    if overwrite and output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    settings = run_settings(input_path, chunk_size, model_type, backend, quantized, out_format, text_field, id_field,
+                            document, rules)
+
+    checkpoint = load_checkpoint(output_dir)
+    if checkpoint is not None and checkpoint['settings'] != settings:
+        raise ValueError(
+            f"{output_dir} holds a run with different settings or input; "
+            f"use another output directory or --overwrite"
+        )
+    if checkpoint is None:
+        checkpoint = {'settings': settings, 'completed': [], 'rows': 0, 'errors': 0, 'finished': False}
+    if checkpoint['finished']:
+        print(f"✓ Already complete: {checkpoint['rows']} rows in {output_dir}")
+        return checkpoint
+
+    completed = set(checkpoint['completed'])
+    if completed:
+        print(f"Resuming: {len(completed)} chunks ({checkpoint['rows']} rows) already scored")
+
+    start = time.perf_counter()
+    new_rows = 0
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(model_type, backend, quantized, threads_per_worker, rules)
+    ) as pool:
+        pending = set()
+
+        def collect(done):
+            nonlocal new_rows
+            for future in done:
+                chunk_id, rows, errors = future.result()
+                completed.add(chunk_id)
+                checkpoint['completed'] = sorted(completed)
+                checkpoint['rows'] += rows
+                checkpoint['errors'] += errors
+                save_checkpoint(output_dir, checkpoint)
+                new_rows += rows
+                rate = new_rows / (time.perf_counter() - start)
+                print(f"✓ chunk {chunk_id} ({rows} rows) - {checkpoint['rows']} total, {rate:.0f} rows/s")
+
+        for chunk_id, first_row, records in iter_chunks(input_path, fmt, chunk_size, skip=completed):
+            if records is None:
+                continue
+            # Bounded read-ahead: at most two chunks per worker in memory
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            part_path = output_dir / f"part-{chunk_id:06d}.{out_format}"
+            pending.add(pool.submit(
+                _score_chunk, chunk_id, first_row, records, str(part_path),
+                fmt, out_format, text_field, id_field, batch_size, document
+            ))
+        collect(wait(pending).done)
+
+    checkpoint['finished'] = True
+    save_checkpoint(output_dir, checkpoint)
+    (output_dir / SUCCESS_NAME).touch()
+    print(f"✓ Scored {checkpoint['rows']} rows ({checkpoint['errors']} errors) into {output_dir}")
+    return checkpoint
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a large JSONL/CSV/text file with worker processes")
+    parser.add_argument('input', help="Input .jsonl/.ndjson (one record per line), .csv or .txt (one text per line)")
+    parser.add_argument('output_dir', help="Directory for part files and the checkpoint")
+    parser.add_argument('--model', default='cnn', choices=['cnn', 'lstm'])
+    parser.add_argument('--backend', default='torch', choices=list(BACKENDS))
+    parser.add_argument('--quantized', action='store_true')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--threads-per-worker', type=int, default=None, help="Intra-op threads per worker")
+    parser.add_argument('--chunk-size', type=int, default=50_000, help="Records per part file / checkpoint")
+    parser.add_argument('--batch-size', type=int, default=1024, help="Texts per forward pass")
+    parser.add_argument('--format', default='jsonl', choices=list(OUTPUT_FORMATS))
+    parser.add_argument('--text-field', default='text', help="Text column/key of JSONL and CSV records")
+    parser.add_argument('--id-field', default=None, help="Column/key copied to the output as 'id'")
+    parser.add_argument('--overwrite', action='store_true', help="Discard previous output instead of resuming")
+    parser.add_argument('--document', default=None, choices=list(SEGMENT_MODES),
+                        help="Score long texts by sentences or sliding windows, with per-segment results")
+    parser.add_argument('--window', type=int, default=50,
+                        help="Max tokens per segment, at most the model's max_seq_len (--document)")
+    parser.add_argument('--stride', type=int, default=25, help="Tokens between window starts (--document)")
+    parser.add_argument('--rules', action='store_true',
+                        help="Add the lexicon/pattern analysis of src/data (as in the frontend) to each row")
+    args = parser.parse_args()
+
+    score_bulk(
+        args.input, args.output_dir, args.model, args.backend, args.quantized,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        out_format=args.format,
+        text_field=args.text_field,
+        id_field=args.id_field,
+        overwrite=args.overwrite,
+        document=(args.document, args.window, args.stride) if args.document else None,
+        rules=args.rules
+    )
@@ -3,18 +3,88 @@ import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import TensorDataset, DataLoader
 from pathlib import Path
+from functools import partial
+import argparse
 import sys
 import time
 
 # Add models to path
 sys.path.append(str(Path(__file__).parent.parent))
 from models.classifiers import CNNTextClassifier, LSTMTextClassifier
+from scripts.memmap_dataset import DEFAULT_DIR as MEMMAP_DIR, HEADER_NAME, MemmapTextDataset
+from scripts.bucketing import LengthBucketSampler
+
+def load_datasets(data_dir=None):
+    """
+    Train/val/test datasets and vocab size. Uses the memmap format
+    (data/processed/memmap or data_dir) when present, else datasets.pt.
+    """
+    data_dir = Path(data_dir) if data_dir else MEMMAP_DIR
+    
+    if (data_dir / HEADER_NAME).exists():
+        datasets = [MemmapTextDataset(data_dir, split) for split in ('train', 'val', 'test')]
+        vocab_size = datasets[0].header.get('vocab_size', 129)
+        print(f"Using memmap dataset: {data_dir}")
+        return (*datasets, vocab_size)
+    
+    data_path = Path(__file__).parent.parent / "data" / "processed" / "datasets.pt"
+    data = torch.load(data_path)
+    
+    X_train, y_train = data['X_train'], data['y_train']
+    X_val, y_val = data['X_val'], data['y_val']
+    X_test, y_test = data['X_test'], data['y_test']
+    
+    vocab_size = 129  # From preprocessor
+    return TensorDataset(X_train, y_train), TensorDataset(X_val, y_val), TensorDataset(X_test, y_test), vocab_size
+
+def dataset_lengths(dataset):
+    """Real token count of every sample, for length bucketing"""
+    if isinstance(dataset, MemmapTextDataset):
+        return dataset.lengths()
+    return (dataset.tensors[0] != 0).sum(dim=1).numpy()
+
+def collate_trimmed(batch, pad_extra=0):
+    """Stack a batch and cut padding beyond its longest sequence (+ pad_extra)"""
+    X = torch.stack([x for x, _ in batch])
+    y = torch.stack([label for _, label in batch])
+    lengths = (X != 0).sum(dim=1)
+    width = min(X.size(1), max(int(lengths.max()) + pad_extra, 1))
+    return X[:, :width].contiguous(), y, lengths
+
+def unpack_batch(batch, device, non_blocking=False):
+    """(X, y, lengths) on device; lengths is None for fixed-length batches"""
+    X_batch = batch[0].to(device, non_blocking=non_blocking)
+    y_batch = batch[1].to(device, non_blocking=non_blocking)
+    lengths = batch[2] if len(batch) > 2 else None  # stays on CPU for packing
+    return X_batch, y_batch, lengths
+
+def make_loader(dataset, batch_size=32, shuffle=False, num_workers=0, prefetch_factor=2,
+                persistent_workers=False, pin_memory=False, bucket=False, pad_extra=0):
+    """
+    DataLoader with the worker/prefetch options that only apply when num_workers > 0.
+    With bucket=True, batches group samples of similar length and are padded
+    only to their own longest sample (plus pad_extra), yielding (X, y, lengths).
+    """
+    kwargs = {}
+    if num_workers > 0:
+        kwargs['prefetch_factor'] = prefetch_factor
+        kwargs['persistent_workers'] = persistent_workers
+    
+    if bucket:
+        sampler = LengthBucketSampler(dataset_lengths(dataset), batch_size, shuffle=shuffle)
+        return DataLoader(dataset, batch_sampler=sampler, num_workers=num_workers, pin_memory=pin_memory,
+                          collate_fn=partial(collate_trimmed, pad_extra=pad_extra), **kwargs)
+    
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+                      pin_memory=pin_memory, **kwargs)
 
 def train_model(model, train_loader, val_loader, criterion, optimizer, num_epochs=15, device='cpu'):
     """Train the model"""
     best_val_acc = 0.0
     patience = 3
     patience_counter = 0
+    # Pinned host batches can be copied asynchronously
+    non_blocking = train_loader.pin_memory
     
     for epoch in range(num_epochs):
         # Training
@@ -22,12 +92,18 @@ def train_model(model, train_loader, val_loader, criterion, optimizer, num_epoch
         train_loss = 0.0
         train_correct = 0
         train_total = 0
+        data_time = 0.0
+        compute_time = 0.0
         
-        for X_batch, y_batch in train_loader:
-            X_batch, y_batch = X_batch.to(device), y_batch.to(device)
+        batch_start = time.perf_counter()
+        for batch in train_loader:
+            loaded = time.perf_counter()
+            data_time += loaded - batch_start
+            
+            X_batch, y_batch, lengths = unpack_batch(batch, device, non_blocking)
             
             optimizer.zero_grad()
-            outputs = model(X_batch)
+            outputs = model(X_batch, lengths)
             loss = criterion(outputs, y_batch)
             loss.backward()
             optimizer.step()
@@ -36,6 +112,10 @@ def train_model(model, train_loader, val_loader, criterion, optimizer, num_epoch
             _, predicted = torch.max(outputs, 1)
             train_total += y_batch.size(0)
             train_correct += (predicted == y_batch).sum().item()
+            
+            # .item() above synchronizes, so this includes the device work
+            batch_start = time.perf_counter()
+            compute_time += batch_start - loaded
         
         train_acc = 100 * train_correct / train_total
         
@@ -46,9 +126,9 @@ def train_model(model, train_loader, val_loader, criterion, optimizer, num_epoch
         val_total = 0
         
         with torch.no_grad():
-            for X_batch, y_batch in val_loader:
-                X_batch, y_batch = X_batch.to(device), y_batch.to(device)
-                outputs = model(X_batch)
+            for batch in val_loader:
+                X_batch, y_batch, lengths = unpack_batch(batch, device)
+                outputs = model(X_batch, lengths)
                 loss = criterion(outputs, y_batch)
                 
                 val_loss += loss.item()
@@ -61,6 +141,8 @@ def train_model(model, train_loader, val_loader, criterion, optimizer, num_epoch
         print(f"Epoch [{epoch+1}/{num_epochs}] "
               f"Train Loss: {train_loss/len(train_loader):.4f}, Train Acc: {train_acc:.2f}% | "
               f"Val Loss: {val_loss/len(val_loader):.4f}, Val Acc: {val_acc:.2f}%")
+        print(f"  Train time: data wait {data_time:.2f}s, compute {compute_time:.2f}s "
+              f"({len(train_loader) / max(data_time + compute_time, 1e-9):.1f} batches/s)")
         
         # Early stopping
         if val_acc > best_val_acc:
@@ -83,9 +165,9 @@ def evaluate_model(model, test_loader, device='cpu'):
     total = 0
     
     with torch.no_grad():
-        for X_batch, y_batch in test_loader:
-            X_batch, y_batch = X_batch.to(device), y_batch.to(device)
-            outputs = model(X_batch)
+        for batch in test_loader:
+            X_batch, y_batch, lengths = unpack_batch(batch, device)
+            outputs = model(X_batch, lengths)
             _, predicted = torch.max(outputs, 1)
             total += y_batch.size(0)
             correct += (predicted == y_batch).sum().item()
@@ -93,38 +175,51 @@ def evaluate_model(model, test_loader, device='cpu'):
     accuracy = 100 * correct / total
     return accuracy
 
-def main(model_type='cnn'):
+def main(model_type='cnn', data_dir=None, batch_size=32, num_workers=0, prefetch_factor=2,
+         persistent_workers=False, pin_memory=None, num_threads=None, num_epochs=15, bucket=False):
     # Device
-    device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
+    if torch.cuda.is_available():
+        device = torch.device('cuda')
+    else:
+        device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
     print(f"Using device: {device}")
     
-    # Load data
-    data_path = Path(__file__).parent.parent / "data" / "processed" / "datasets.pt"
-    data = torch.load(data_path)
-    
-    X_train, y_train = data['X_train'], data['y_train']
-    X_val, y_val = data['X_val'], data['y_val']
-    X_test, y_test = data['X_test'], data['y_test']
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    print(f"Intra-op threads: {torch.get_num_threads()}, DataLoader workers: {num_workers}")
     
-    # Create DataLoaders
-    train_dataset = TensorDataset(X_train, y_train)
-    val_dataset = TensorDataset(X_val, y_val)
-    test_dataset = TensorDataset(X_test, y_test)
+    # Pinned memory only pays off for host-to-GPU copies
+    if pin_memory is None:
+        pin_memory = device.type == 'cuda'
     
-    train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=32)
-    test_loader = DataLoader(test_dataset, batch_size=32)
+    # Load data
+    train_dataset, val_dataset, test_dataset, vocab_size = load_datasets(data_dir)
     
     # Create model
-    vocab_size = 129  # From preprocessor
-    
     if model_type == 'cnn':
         model = CNNTextClassifier(vocab_size=vocab_size, embedding_dim=100, num_classes=4)
     else:
         model = LSTMTextClassifier(vocab_size=vocab_size, embedding_dim=100, hidden_dim=64, num_classes=4)
+        # Packed training is recorded in the checkpoint, so serving packs too
+        model.packed = bucket
     
     model = model.to(device)
     
+    # Create DataLoaders. When bucketing, the CNN keeps pad_margin extra
+    # padding (same pooled values as full padding); the LSTM gets packed.
+    loader_kwargs = dict(
+        batch_size=batch_size,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor,
+        persistent_workers=persistent_workers,
+        pin_memory=pin_memory,
+        bucket=bucket,
+        pad_extra=model.pad_margin or 0
+    )
+    train_loader = make_loader(train_dataset, shuffle=True, **loader_kwargs)
+    val_loader = make_loader(val_dataset, **loader_kwargs)
+    test_loader = make_loader(test_dataset, **loader_kwargs)
+    
     # Loss and optimizer
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=0.001)
@@ -135,7 +230,7 @@ def main(model_type='cnn'):
     print(f"{'='*60}\n")
     
     start_time = time.time()
-    best_val_acc = train_model(model, train_loader, val_loader, criterion, optimizer, num_epochs=15, device=device)
+    best_val_acc = train_model(model, train_loader, val_loader, criterion, optimizer, num_epochs=num_epochs, device=device)
     training_time = time.time() - start_time
     
     # Load best model and evaluate
@@ -152,6 +247,30 @@ def main(model_type='cnn'):
     return test_acc
 
 if __name__ == "__main__":
-    import sys
-    model_type = sys.argv[1] if len(sys.argv) > 1 else 'cnn'
-    main(model_type)
+    parser = argparse.ArgumentParser(description="Train a text emotion classifier")
+    parser.add_argument('model_type', nargs='?', default='cnn', choices=['cnn', 'lstm'])
+    parser.add_argument('data_dir', nargs='?', default=None,
+                        help="Memmap dataset directory (default: data/processed/memmap, else datasets.pt)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--epochs', type=int, default=15)
+    parser.add_argument('--num-workers', type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument('--prefetch-factor', type=int, default=2, help="Batches prefetched per worker")
+    parser.add_argument('--persistent-workers', action='store_true', help="Keep workers alive between epochs")
+    parser.add_argument('--pin-memory', action=argparse.BooleanOptionalAction, default=None,
+                        help="Pin host memory (default: on for CUDA)")
+    parser.add_argument('--threads', type=int, default=None, help="torch.set_num_threads for compute")
+    parser.add_argument('--bucket', action='store_true',
+                        help="Length-bucketed batches padded to their own longest sample (LSTM uses packed sequences)")
+    args = parser.parse_args()
+    
+    main(
+        args.model_type, args.data_dir,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        prefetch_factor=args.prefetch_factor,
+        persistent_workers=args.persistent_workers,
+        pin_memory=args.pin_memory,
+        num_threads=args.threads,
+        num_epochs=args.epochs,
+        bucket=args.bucket
+    )
@@ -0,0 +1,63 @@
+import json
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from scripts.predict import PREPROCESSOR_PATH, get_predictor
+from scripts.bucketing import predict_proba_bucketed
+from serving.backends import BACKENDS
+from serving.cache import SqlitePredictionCache, artifact_hash, sequence_key
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / "data" / "cache" / "predictions.db"
+
+def read_phrases(path):
+    """One phrase per line (.txt) or {'text': ...} records (.jsonl / .json)"""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix == '.json':
+            return [record['text'] for record in json.load(f)]
+        if path.suffix == '.jsonl':
+            return [json.loads(line)['text'] for line in f if line.strip()]
+        return [line.strip() for line in f if line.strip()]
+
+def warm_cache(phrases_path, cache_path=DEFAULT_CACHE_PATH, model_type='cnn', backend='torch',
+               quantized=False, max_size=1_000_000, batch_size=256):
+    """Score frequent phrases once and store them in the shared SQLite cache"""
+    predictor = get_predictor(model_type, backend, quantized)
+    model_hash = artifact_hash(predictor.artifact_path, PREPROCESSOR_PATH)
+    cache = SqlitePredictionCache(cache_path, model_hash=model_hash, max_size=max_size)
+
+    phrases = read_phrases(phrases_path)
+    X = predictor.preprocessor.texts_to_tensor(phrases)
+
+    # Phrases that encode to the same tokens share one entry
+    unique = {}
+    for i, row in enumerate(X.tolist()):
+        unique.setdefault(sequence_key(row), i)
+    rows = list(unique.values())
+
+    probabilities = predict_proba_bucketed(predictor.model, X[rows], batch_size).tolist()
+    cache.put_many(zip(unique.keys(), probabilities))
+    cache.flush()
+    cache.evict()
+
+    print(f"✓ Warmed {len(rows)} entries ({len(phrases)} phrases) for model {model_hash}")
+    print(f"  Cache: {cache_path}")
+    return len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preload the shared prediction cache from a file of phrases")
+    parser.add_argument('phrases', help="Text file with one phrase per line, or JSON/JSONL records with 'text'")
+    parser.add_argument('--cache-path', default=str(DEFAULT_CACHE_PATH))
+    parser.add_argument('--model', default='cnn', choices=['cnn', 'lstm'])
+    parser.add_argument('--backend', default='torch', choices=list(BACKENDS))
+    parser.add_argument('--quantized', action='store_true')
+    parser.add_argument('--max-size', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    warm_cache(
+        args.phrases, args.cache_path, args.model, args.backend,
+        args.quantized, args.max_size, args.batch_size
+    )
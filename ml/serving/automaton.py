@@ -0,0 +1,117 @@
+from collections import deque
+import numpy as np
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a list of literal keys: every occurrence of
+    every key in a text is found in one pass over its characters, whatever
+    the number of keys.
+
+    The transitions are a dense (states, alphabet) table. Characters that
+    appear in no key share code 0, which always leads back to the root, so
+    padding with 0 is neutral. find() walks one text; find_batch() steps all
+    the texts of a batch together, one numpy gather per character position,
+    which is what makes corpus-scale matching cheap.
+    """
+    def __init__(self, keys):
+        self.keys = list(keys)
+        chars = sorted({char for key in self.keys for char in key})
+        self.alphabet = {char: code for code, char in enumerate(chars, start=1)}
+        self.width = len(chars) + 1
+
+        # Trie
+        goto = [{}]
+        outputs = [[]]
+        for key_id, key in enumerate(self.keys):
+            if not key:
+                raise ValueError("Empty keys can't be matched")
+            state = 0
+            for char in key:
+                code = self.alphabet[char]
+                if code not in goto[state]:
+                    goto[state][code] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = goto[state][code]
+            outputs[state].append(key_id)
+
+        # Failure links in breadth-first order, folded into the dense table
+        delta = np.zeros((len(goto), self.width), dtype=np.int32)
+        fail = [0] * len(goto)
+        queue = deque()
+        for code, child in goto[0].items():
+            delta[0, code] = child
+            queue.append(child)
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            delta[state] = delta[fail[state]]
+            for code, child in goto[state].items():
+                fail[child] = delta[fail[state], code]
+                delta[state, code] = child
+                queue.append(child)
+
+        self.outputs = outputs
+        self.lengths = [len(key) for key in self.keys]
+        self.delta = delta.ravel()
+        self.has_output = np.array([bool(keys) for keys in outputs])
+        self._rows = delta.tolist()
+
+        # Code point -> alphabet code; everything past the table is code 0
+        self._lookup = np.zeros(max(map(ord, chars), default=0) + 2, dtype=np.int32)
+        for char, code in self.alphabet.items():
+            self._lookup[ord(char)] = code
+
+    @property
+    def num_states(self):
+        return len(self.outputs)
+
+    def encode(self, text):
+        """Alphabet codes of a text, shape (len(text),)"""
+        points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        return self._lookup[np.minimum(points, len(self._lookup) - 1)]
+
+    def find(self, text):
+        """(start, key_id) of every key occurrence in text, by end position"""
+        found = []
+        rows, alphabet, outputs, lengths = self._rows, self.alphabet, self.outputs, self.lengths
+        state = 0
+        for end, char in enumerate(text, start=1):
+            state = rows[state][alphabet.get(char, 0)]
+            for key_id in outputs[state]:
+                found.append((end - lengths[key_id], key_id))
+        return found
+
+    def find_batch(self, texts):
+        """find() for a list of texts, stepping all of them at once"""
+        found = [[] for _ in texts]
+        if not texts:
+            return found
+        # Longest first, so the texts still running at step t are a prefix of the rows
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        lengths = np.array([len(texts[i]) for i in order])
+        if lengths[0] == 0:
+            return found
+        codes = np.zeros((lengths[0], len(texts)), dtype=np.int32)
+        codes.T[np.arange(lengths[0]) < lengths[:, None]] = self.encode(''.join(texts[i] for i in order))
+        active = np.searchsorted(-lengths, -np.arange(lengths[0]), side='left')
+
+        state = np.zeros(len(texts), dtype=np.int64)
+        hit_rows, hit_ends, hit_states = [], [], []
+        for position in range(lengths[0]):
+            count = active[position]
+            current = self.delta[state[:count] * self.width + codes[position, :count]]
+            state[:count] = current
+            rows = np.flatnonzero(self.has_output[current])
+            if len(rows):
+                hit_rows.append(rows)
+                hit_ends.append(np.full(len(rows), position + 1))
+                hit_states.append(current[rows])
+        if not hit_rows:
+            return found
+
+        for row, end, hit in zip(*(np.concatenate(parts).tolist() for parts in (hit_rows, hit_ends, hit_states))):
+            matches = found[order[row]]
+            for key_id in self.outputs[hit]:
+                matches.append((end - self.lengths[key_id], key_id))
+        return found
@@ -0,0 +1,186 @@
+import os
+import json
+import warnings
+import numpy as np
+from pathlib import Path
+
+EXPORTS_DIR = Path(__file__).parent.parent / "exports"
+
+MODEL_NAMES = {
+    'cnn': 'CNNTextClassifier',
+    'lstm': 'LSTMTextClassifier',
+}
+
+BACKENDS = ('torch', 'onnx', 'torchscript')
+
+# Extra file stored next to the graph in TorchScript exports
+TORCHSCRIPT_METADATA = 'metadata.json'
+
+def artifact_path(model_type, suffix, exports_dir=EXPORTS_DIR):
+    """Path of an exported artifact, e.g. exports/best_CNNTextClassifier.onnx"""
+    if model_type not in MODEL_NAMES:
+        raise ValueError(f"Unknown model type: {model_type}")
+    return Path(exports_dir) / f"best_{MODEL_NAMES[model_type]}{suffix}"
+
+def backend_artifact(model_type, backend='torch', quantized=False):
+    """Artifact a backend loads by default for a model type"""
+    if backend == 'onnx':
+        return artifact_path(model_type, ".onnx")
+    if backend == 'torchscript':
+        return artifact_path(model_type, ".torchscript.pt")
+    return artifact_path(model_type, "_int8.pth" if quantized else ".pth")
+
+def softmax(logits):
+    """Row-wise softmax over a (batch, num_classes) array"""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+class TorchBackend:
+    """
+    Runs a PyTorch checkpoint (exports/best_*.pth), or its int8
+    version (exports/best_*_int8.pth) when quantized=True.
+    """
+    name = 'torch'
+
+    def __init__(self, model_type, vocab_size, model_path=None, device=None, quantized=False, num_threads=None):
+        import torch
+        from models.classifiers import build_model, quantize_model
+
+        self.torch = torch
+        self.model_type = model_type
+        self.quantized = quantized
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        if quantized:
+            # Dynamically quantized kernels only exist on CPU
+            self.device = torch.device('cpu')
+            self.model_path = Path(model_path or backend_artifact(model_type, 'torch', quantized=True))
+            if not self.model_path.exists():
+                raise FileNotFoundError(
+                    f"{self.model_path} not found, run scripts/quantize.py first"
+                )
+            model = quantize_model(build_model(model_type, vocab_size))
+            # Quantized LSTM weights are packed ScriptObjects, which the
+            # weights_only unpickler rejects; the file is our own export
+            load_kwargs = {'weights_only': False}
+        else:
+            self.device = device or torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
+            self.model_path = Path(model_path or backend_artifact(model_type, 'torch'))
+            model = build_model(model_type, vocab_size)
+            load_kwargs = {}
+
+        model.load_state_dict(torch.load(self.model_path, map_location=self.device, **load_kwargs))
+        self.model = model.to(self.device)
+        self.model.eval()
+        # Padding past the longest row a batch needs (None: full padding only)
+        self.pad_margin = getattr(self.model, 'pad_margin', None)
+
+    @property
+    def num_threads(self):
+        return self.torch.get_num_threads()
+
+    def logits(self, X):
+        """X: int64 array (batch, seq_len) -> float32 array (batch, num_classes)"""
+        X = self.torch.from_numpy(np.ascontiguousarray(X, dtype=np.int64)).to(self.device)
+        with self.torch.no_grad():
+            outputs = self.model(X)
+        return outputs.cpu().numpy()
+
+    def predict_proba(self, X):
+        return softmax(self.logits(X))
+
+class OnnxBackend:
+    """Runs an ONNX export (exports/best_*.onnx) through onnxruntime, without torch"""
+    name = 'onnx'
+
+    def __init__(self, model_type, model_path=None, num_threads=None):
+        import onnxruntime as ort
+
+        self.model_type = model_type
+        self.model_path = Path(model_path or backend_artifact(model_type, 'onnx'))
+        if not self.model_path.exists():
+            raise FileNotFoundError(
+                f"{self.model_path} not found, run scripts/export_onnx.py first"
+            )
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            str(self.model_path), options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        # Written by scripts/export_onnx.py for models that accept trimmed padding
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.pad_margin = int(metadata['pad_margin']) if 'pad_margin' in metadata else None
+        self._num_threads = num_threads or os.cpu_count() or 1
+
+    @property
+    def num_threads(self):
+        return self._num_threads
+
+    def logits(self, X):
+        X = np.ascontiguousarray(X, dtype=np.int64)
+        return self.session.run(None, {self.input_name: X})[0]
+
+    def predict_proba(self, X):
+        return softmax(self.logits(X))
+
+class TorchScriptBackend:
+    """
+    Runs a frozen TorchScript export (exports/best_*.torchscript.pt) written
+    by scripts/export_torchscript.py. The graph executes without Python
+    dispatch per op, and needs no model classes to load.
+    """
+    name = 'torchscript'
+
+    def __init__(self, model_type, model_path=None, num_threads=None):
+        import torch
+
+        self.torch = torch
+        self.model_type = model_type
+        self.model_path = Path(model_path or backend_artifact(model_type, 'torchscript'))
+        if not self.model_path.exists():
+            raise FileNotFoundError(
+                f"{self.model_path} not found, run scripts/export_torchscript.py first"
+            )
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        extra_files = {TORCHSCRIPT_METADATA: ''}
+        with warnings.catch_warnings():
+            # Newer torch flags torch.jit as deprecated; the format still loads fine
+            warnings.simplefilter('ignore', FutureWarning)
+            self.model = torch.jit.load(str(self.model_path), map_location='cpu', _extra_files=extra_files)
+        self.model.eval()
+        metadata = json.loads(extra_files[TORCHSCRIPT_METADATA] or '{}')
+        self.pad_margin = metadata.get('pad_margin')
+
+    @property
+    def num_threads(self):
+        return self.torch.get_num_threads()
+
+    def logits(self, X):
+        X = self.torch.from_numpy(np.ascontiguousarray(X, dtype=np.int64))
+        with self.torch.inference_mode():
+            outputs = self.model(X)
+        return outputs.numpy()
+
+    def predict_proba(self, X):
+        return softmax(self.logits(X))
+
+def load_backend(model_type, backend='torch', vocab_size=None, **kwargs):
+    """Create the inference backend for a model type"""
+    if backend == 'torch':
+        return TorchBackend(model_type, vocab_size, **kwargs)
+    if backend == 'onnx':
+        if kwargs.pop('quantized', False):
+            raise ValueError("Quantized artifacts are only available for the torch backend")
+        return OnnxBackend(model_type, **kwargs)
+    if backend == 'torchscript':
+        if kwargs.pop('quantized', False):
+            raise ValueError("Quantized artifacts are only available for the torch backend")
+        return TorchScriptBackend(model_type, **kwargs)
+    raise ValueError(f"Unknown backend: {backend} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,109 @@
+import asyncio
+from serving.executor import QueueFullError
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single predictions into one forward pass.
+    Requests are queued and flushed when max_batch_size is reached
+    or max_wait_ms has passed since the first request of the batch.
+    Up to max_concurrency batches are in flight at once; while they run,
+    new requests keep accumulating into the next batch.
+    """
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=5.0,
+                 max_concurrency=1, max_queue_size=0):
+        # run_batch: async callable(list of sequences) -> list of results
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self._queue = None
+        self._slots = None
+        self._task = None
+        self._inflight = set()
+
+    @property
+    def queue_depth(self):
+        """Requests waiting to be batched"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Start the background batching task"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def stop(self):
+        """Stop the background task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, sequence):
+        """Queue one sequence and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((sequence, future))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Batch queue full ({self._queue.qsize()} waiting)")
+        return await future
+
+    async def _collect(self):
+        """Wait for the first item, then gather more until the window closes"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Anything that arrived while we were waiting rides along for free
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free slot first so the queue keeps filling meanwhile
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            # Drop requests whose client already went away
+            batch = [(seq, fut) for seq, fut in batch if not fut.done()]
+            if not batch:
+                return
+
+            try:
+                results = await self.run_batch([seq for seq, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
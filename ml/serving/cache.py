@@ -0,0 +1,340 @@
+import os
+import queue
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+def artifact_fingerprint(*paths):
+    """Changes whenever one of the files is rewritten (mtime or size)"""
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+def artifact_hash(*paths):
+    """Content hash of the model and preprocessor files, shared by all workers"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+def sequence_key(sequence):
+    """
+    Cache key for an encoded sequence. Texts that differ only in case,
+    spacing, unknown words or words past max_seq_len share one entry.
+    """
+    return tuple(sequence)
+
+class PredictionCache:
+    """
+    In-process LRU cache of prediction probabilities with a TTL.
+    Entries are dropped least-recently-used first once max_size is reached,
+    and on lookup once they are older than ttl_seconds (0 = no expiry).
+    The whole cache is cleared when the fingerprint of the model and
+    preprocessor files changes, checked at most every check_interval seconds.
+    """
+    # Lookups are in memory, cheap enough for the event loop
+    blocking = False
+
+    def __init__(self, max_size=10000, ttl_seconds=3600, fingerprint_fn=None, check_interval=5.0):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.fingerprint_fn = fingerprint_fn
+        self.check_interval = check_interval
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._fingerprint = fingerprint_fn() if fingerprint_fn else None
+        self._next_check = time.monotonic() + check_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Cached value for key, or None"""
+        now = time.monotonic()
+        self._maybe_invalidate(now)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl and now - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def put_many(self, items):
+        for key, value in items:
+            self.put(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _maybe_invalidate(self, now):
+        if self.fingerprint_fn is None or now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            fingerprint = self.fingerprint_fn()
+        except OSError:
+            # Artifact being rewritten right now; try again next interval
+            return
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'memory',
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+class SqlitePredictionCache:
+    """
+    Prediction cache in a SQLite file (WAL mode) shared by every API worker
+    process on the host. Rows are keyed by (model hash, token sequence), so
+    a new model or preprocessor never sees stale entries. The table is kept
+    under max_size rows by deleting the least recently used ones.
+    Writes go through a background thread, so a worker waiting on another
+    process's write lock never blocks a request. Reads hit the file, so
+    async callers run them in a thread (see `blocking`).
+    """
+    # get()/get_many() do SQLite I/O and must stay off the event loop
+    blocking = True
+
+    # Refresh last_used on a hit only if it is older than this, to keep
+    # hot reads from turning into writes
+    TOUCH_INTERVAL = 60.0
+
+    def __init__(self, path, model_hash, max_size=1_000_000, ttl_seconds=0, evict_every=1000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_hash = model_hash
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes = queue.SimpleQueue()
+        self._puts = 0
+        # Guards the counters: lookups run in executor and to_thread workers,
+        # size and evictions move in the writer thread
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " model_hash TEXT NOT NULL,"
+            " tokens BLOB NOT NULL,"
+            " probs BLOB NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model_hash, tokens)"
+            ") WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)")
+        conn.commit()
+        # Running row count for stats(): counted here and on every eviction
+        # pass, with this process's inserts added in between (replaced rows
+        # and other workers' inserts make it approximate until the next pass)
+        self.size = conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+        self._writer = threading.Thread(target=self._write_loop, name="prediction-cache-writer", daemon=True)
+        self._writer.start()
+
+    def _conn(self):
+        # sqlite3 connections are per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode_key(key):
+        return array('i', key).tobytes()
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        conn = self._conn()
+        now = time.time()
+        results = []
+        stale = []
+        hits = misses = 0
+        for key in keys:
+            tokens = self._encode_key(key)
+            row = conn.execute(
+                "SELECT probs, created_at, last_used FROM predictions WHERE model_hash = ? AND tokens = ?",
+                (self.model_hash, tokens)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                misses += 1
+                results.append(None)
+                continue
+            hits += 1
+            results.append(array('d', row[0]).tolist())
+            if now - row[2] > self.TOUCH_INTERVAL:
+                stale.append((now, self.model_hash, tokens))
+
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        if stale:
+            self._writes.put(('touch', stale))
+        return results
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def put_many(self, items):
+        if self.max_size <= 0:
+            return
+        now = time.time()
+        rows = [
+            (self.model_hash, self._encode_key(key), array('d', value).tobytes(), now, now)
+            for key, value in items
+        ]
+        if rows:
+            self._writes.put(('insert', rows))
+
+    def flush(self, timeout=None):
+        """Block until every queued write has been committed"""
+        done = threading.Event()
+        self._writes.put(('flush', done))
+        done.wait(timeout)
+
+    def close(self):
+        """Stop the writer thread once the writes queued so far are committed; later puts are dropped"""
+        self._writes.put(('stop', None))
+
+    def _write_loop(self):
+        stopped = False
+        while not stopped:
+            # Coalesce whatever is queued into one transaction
+            ops = [self._writes.get()]
+            while True:
+                try:
+                    ops.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            conn = self._conn()
+            inserted = 0
+            try:
+                for kind, payload in ops:
+                    if kind == 'insert':
+                        conn.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)", payload)
+                        inserted += len(payload)
+                    elif kind == 'touch':
+                        conn.executemany(
+                            "UPDATE predictions SET last_used = ? WHERE model_hash = ? AND tokens = ?", payload
+                        )
+                conn.commit()
+            except sqlite3.Error as e:
+                # The cache is best effort: drop this batch rather than fail requests
+                conn.rollback()
+                print(f"Prediction cache write failed: {e}")
+
+            self._puts += inserted
+            with self._lock:
+                self.size += inserted
+            if self._puts >= self.evict_every:
+                self._puts = 0
+                try:
+                    self.evict()
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    print(f"Prediction cache eviction failed: {e}")
+
+            for kind, payload in ops:
+                if kind == 'flush':
+                    payload.set()
+                elif kind == 'stop':
+                    stopped = True
+
+    def evict(self):
+        """Delete least recently used rows beyond max_size"""
+        conn = self._conn()
+        size = conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        excess = size - self.max_size
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM predictions WHERE (model_hash, tokens) IN ("
+                " SELECT model_hash, tokens FROM predictions ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            conn.commit()
+        evicted = max(excess, 0)
+        with self._lock:
+            self.evictions += evicted
+            self.size = size - evicted
+
+    def clear(self):
+        self.flush()
+        conn = self._conn()
+        conn.execute("DELETE FROM predictions WHERE model_hash = ?", (self.model_hash,))
+        conn.commit()
+        size = conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        with self._lock:
+            self.size = size
+
+    def stats(self):
+        with self._lock:
+            hits, misses, size, evictions = self.hits, self.misses, self.size, self.evictions
+        lookups = hits + misses
+        return {
+            'backend': 'sqlite',
+            'path': str(self.path),
+            'model_hash': self.model_hash,
+            'size': size,
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'evictions': evictions
+        }
@@ -0,0 +1,89 @@
+import re
+import numpy as np
+
+# Long-document scoring: the models only see the first max_seq_len tokens of
+# a text, so documents are cut into segments that fit, every segment of every
+# document is scored in one batch, and the document distribution is the
+# average of its segments. Segments are rebuilt from the whitespace tokens the
+# preprocessor splits on, so each one encodes exactly like the original words.
+
+SEGMENT_MODES = ('sentences', 'windows')
+
+# A sentence ends at . ! ? or … followed by whitespace, or at a line break
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+|\s*\n\s*')
+
+def split_sentences(text):
+    """Non-empty sentences of a text"""
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+def window_spans(num_tokens, window, stride):
+    """(start, end) token spans of overlapping windows covering num_tokens"""
+    if num_tokens <= window:
+        return [(0, num_tokens)]
+    spans = [(start, start + window) for start in range(0, num_tokens - window, stride)]
+    # The last window is aligned to the end, so no tail is shorter than needed
+    spans.append((num_tokens - window, num_tokens))
+    return spans
+
+def segment_document(text, mode='sentences', window=50, stride=25):
+    """
+    Cut a text into segments of at most `window` tokens.
+    mode="sentences" keeps one segment per sentence, falling back to windows
+    for sentences longer than `window`; mode="windows" slides a window over
+    the whole text, `stride` tokens at a time.
+    Returns a list of (text, start, end), start/end being token offsets in
+    the document. An empty document gives a single empty segment.
+    """
+    if mode not in SEGMENT_MODES:
+        raise ValueError(f"Unknown segment mode: {mode} (expected one of {SEGMENT_MODES})")
+    if not 1 <= stride <= window:
+        raise ValueError(f"stride must be between 1 and window ({window}), got {stride}")
+
+    pieces = split_sentences(text) if mode == 'sentences' else [text]
+    segments = []
+    offset = 0
+    for piece in pieces:
+        words = piece.split()
+        for start, end in window_spans(len(words), window, stride):
+            segments.append((' '.join(words[start:end]), offset + start, offset + end))
+        offset += len(words)
+    return segments or [('', 0, 0)]
+
+def segment_weights(segments):
+    """
+    Weight of each segment in the document distribution: the number of
+    tokens it adds to those already covered, so overlapping windows don't
+    count the same words twice. All-empty documents weigh their segment 1.
+    """
+    weights = []
+    covered = 0
+    for _, start, end in segments:
+        weights.append(max(end - max(start, covered), 0))
+        covered = max(covered, end)
+    if not any(weights):
+        return [1] * len(segments)
+    return weights
+
+def aggregate(probabilities, weights):
+    """Weighted mean of segment probabilities, shape (num_classes,)"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    return np.average(probabilities, axis=0, weights=weights)
+
+def score_documents(predict_proba, texts, mode='sentences', window=50, stride=25):
+    """
+    Segment every text and score all segments with a single predict_proba
+    call (list of texts -> (n, num_classes) probabilities).
+    Returns one (segments, segment_probabilities, document_probabilities)
+    per text.
+    """
+    documents = [segment_document(text, mode, window, stride) for text in texts]
+    flat = [segment for segments in documents for segment, _, _ in segments]
+    probabilities = np.asarray(predict_proba(flat)) if flat else np.empty((0, 0))
+
+    results = []
+    start = 0
+    for segments in documents:
+        probs = probabilities[start:start + len(segments)]
+        start += len(segments)
+        results.append((segments, probs, aggregate(probs, segment_weights(segments))))
+    return results
@@ -0,0 +1,39 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot take more work"""
+    pass
+
+class InferenceExecutor:
+    """
+    Thread pool for model forward passes, kept off the asyncio event loop.
+    At most max_workers jobs run at once and max_queue_size more may wait;
+    anything beyond that is rejected right away so callers can answer 429.
+    """
+    def __init__(self, max_workers, max_queue_size=64):
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        # Only touched from the event loop thread, so no lock is needed
+        self._pending = 0
+
+    @property
+    def pending(self):
+        """Jobs running or waiting for a worker"""
+        return self._pending
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool and await its result"""
+        if self._pending >= self.max_pending:
+            raise QueueFullError(f"Inference queue full ({self._pending} pending)")
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,113 @@
+import torch
+import torch.nn.functional as F
+
+from models.classifiers import FusedCNNTextClassifier
+
+class IncrementalCNN:
+    """
+    Incremental inference for a trained CNNTextClassifier on a token
+    sequence that grows (and sometimes gets revised) over time, such as a
+    live speech-to-text transcript. Gives the same logits as the model on
+    the sequence padded to max_seq_len, in O(new tokens) per update.
+
+    Built on FusedCNNTextClassifier: the three conv branches' outputs at
+    position j are one embedding_bag sum over the window of padded positions
+    around j. Windows that lie entirely on tokens already seen never change,
+    so each session keeps the running (prefix) max of those. Windows that
+    reach past the last token also cover <PAD>s (whose embedding is trained,
+    not zero) and the conv zero padding at the right edge; they change with
+    every new token and are recomputed, a constant number per update (see
+    CNNTextClassifier.pad_margin).
+    """
+    def __init__(self, model, max_seq_len=50):
+        model.eval()
+        self.fused = FusedCNNTextClassifier(model)
+        self.max_seq_len = max_seq_len
+        self.pad_margin = model.pad_margin
+        self.left = self.fused.padding[0]
+        self.kernel_size = self.fused.kernel_size
+        # Start/end channel of each branch in the fused outputs
+        bounds = [0]
+        for channels in self.fused.channels:
+            bounds.append(bounds[-1] + channels)
+        self.branch_channels = list(zip(bounds, bounds[1:]))
+
+    def session(self):
+        return IncrementalSession(self)
+
+    def finalized(self, num_tokens):
+        """Number of leading windows that only cover the first num_tokens tokens"""
+        return max(num_tokens - self.kernel_size + self.left + 1, 0)
+
+    def windows(self, tokens, length, lo, hi):
+        """
+        Pre-bias conv outputs of windows lo..hi-1, shape (hi - lo, channels),
+        for `tokens` followed by <PAD> up to `length` positions.
+        """
+        fused = self.fused
+        ids = []
+        for position in range(lo - self.left, hi - self.left + self.kernel_size - 1):
+            if position < 0 or position >= length:
+                ids.append(fused.pad_id)
+            elif position < len(tokens):
+                ids.append(tokens[position])
+            else:
+                ids.append(0)
+        windows = torch.tensor(ids).unfold(0, self.kernel_size, 1) + fused.tap_offsets
+        return F.embedding_bag(windows, fused.table, mode='sum')
+
+    def head(self, pooled):
+        """Logits from the max-pooled pre-bias conv outputs"""
+        fused = self.fused
+        pooled = F.relu(pooled + fused.bias)
+        return fused.fc2(F.relu(fused.fc1(pooled.unsqueeze(0))))[0]
+
+class IncrementalSession:
+    """Per-stream state of IncrementalCNN: the tokens seen and the prefix max of finished windows"""
+    def __init__(self, cnn):
+        self.cnn = cnn
+        self.tokens = []
+        # prefix_max[j] = max of windows 0..j, for the finalized windows
+        self.prefix_max = []
+
+    def update(self, tokens):
+        """
+        Logits for a new version of the token sequence. Only windows after
+        the prefix shared with the previous version are recomputed.
+        Returns (logits, reused_tokens, computed_windows).
+        """
+        cnn = self.cnn
+        tokens = list(tokens[:cnn.max_seq_len])
+        common = 0
+        for old, new in zip(self.tokens, tokens):
+            if old != new:
+                break
+            common += 1
+        self.tokens = tokens
+        # Drop windows that covered revised tokens
+        del self.prefix_max[cnn.finalized(common):]
+
+        length = min(cnn.max_seq_len, len(tokens) + cnn.pad_margin)
+        done = cnn.finalized(len(tokens))
+        computed = 0
+        with torch.inference_mode():
+            if done > len(self.prefix_max):
+                outputs = cnn.windows(tokens, length, len(self.prefix_max), done)
+                if self.prefix_max:
+                    outputs = torch.maximum(outputs, self.prefix_max[-1])
+                computed += len(outputs)
+                self.prefix_max.extend(torch.cummax(outputs, dim=0).values.unbind(0))
+
+            # Windows that still depend on what comes next; each branch
+            # has its own number of outputs (seq_len + extra)
+            total = length + max(cnn.fused.extra)
+            tail = cnn.windows(tokens, length, done, total)
+            computed += total - done
+            pools = []
+            for (start, end), extra in zip(cnn.branch_channels, cnn.fused.extra):
+                pools.append(tail[:length + extra - done, start:end].max(dim=0).values)
+            pooled = torch.cat(pools)
+            if self.prefix_max:
+                pooled = torch.maximum(pooled, self.prefix_max[-1])
+            logits = cnn.head(pooled)
+        return logits, common, computed
@@ -0,0 +1,421 @@
+import re
+import json
+import math
+import threading
+from pathlib import Path
+
+from serving.automaton import AhoCorasick
+
+# Rule data shipped with the frontend
+DATA_DIR = Path(__file__).parent.parent.parent / "src" / "data"
+LEXICON_PATH = DATA_DIR / "lexicon.json"
+PATTERNS_PATH = DATA_DIR / "patterns.json"
+
+# Same tokens as the frontend: runs of Spanish letters in the lowercased text
+TOKEN_RE = re.compile(r'[a-záéíóúñü]+')
+
+# Lexicon/pattern emotions that count as evidence for each class of the text models
+CLASS_EMOTIONS = {
+    'alegria': ('alegría', 'felicidad', 'diversión', 'celebración', 'satisfacción', 'gratitud'),
+    'tristeza': ('tristeza', 'tristeza_profunda', 'soledad', 'depresión', 'desesperanza', 'decepción',
+                 'nostalgia', 'sufrimiento'),
+    'ira': ('ira', 'odio', 'frustración'),
+    'miedo': ('miedo', 'terror', 'ansiedad', 'nerviosismo', 'preocupación'),
+}
+
+# Sign of the rule score that agrees with each class
+CLASS_POLARITY = {'alegria': 1, 'tristeza': -1, 'ira': -1, 'miedo': -1}
+
+# Tokens before a pattern match looked at for a negation ("ya no me siento feliz")
+NEGATION_WINDOW = 2
+
+# Characters of a token; a lexicon word only counts when it is a whole token
+LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzáéíóúñü')
+_LETTER_RE = re.compile(r'[a-záéíóúñü]')
+
+# Ways of finding the rule matches: the frontend's one regex per pattern plus
+# a token scan, every pattern merged into one alternation, or one
+# Aho-Corasick automaton over the lexicon and the patterns' literal prefixes
+ENGINES = ('naive', 'alternation', 'automaton')
+
+def _js_round(value):
+    """Math.round: halves round up, unlike Python's round"""
+    return math.floor(value + 0.5)
+
+def _exec_all(regex, text):
+    """Matches of a `while (regex.exec(text))` loop with a global JS regex"""
+    position = 0
+    while True:
+        match = regex.search(text, position)
+        if match is None:
+            return
+        yield match
+        position = max(match.end(), match.start() + 1)
+
+def literal_prefixes(pattern):
+    """
+    Literal strings one of which starts every match of a regex pattern:
+    its leading plain characters, with [...] classes of plain characters
+    expanded. Empty list when the pattern has no such prefix (or a
+    top-level alternation).
+    """
+    depth = 0
+    for char in pattern:
+        if char == '\\':
+            return []
+        depth += char == '('
+        depth -= char == ')'
+        if char == '|' and depth == 0:
+            return []
+
+    prefixes = ['']
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '[':
+            end = pattern.index(']', i)
+            options = pattern[i + 1:end]
+            if not options or options[0] == '^' or '-' in options:
+                break
+            following = end + 1
+        elif char in '.^$*+?{}()|':
+            break
+        else:
+            options = char
+            following = i + 1
+        if following < len(pattern) and pattern[following] in '?*{':
+            break  # optional or repeated: not part of every match
+        prefixes = [prefix + option for prefix in prefixes for option in options]
+        i = following
+    return prefixes if prefixes[0] else []
+
+class LexiconAnalyzer:
+    """
+    Python port of analyzeSentimentAdvanced (src/utils/advancedAnalysis.js)
+    over src/data/lexicon.json and src/data/patterns.json, giving the same
+    results as the frontend.
+
+    The frontend runs every pattern as its own regex over the text and then
+    looks every token up in the lexicon, so its cost grows with the number
+    of rules. By default (engine="automaton") one Aho-Corasick automaton
+    over the lexicon words, negations, modifiers and the literal prefixes
+    of the patterns finds everything in a single pass; a pattern is only
+    run where one of its prefixes occurs, and only the tokens that are in
+    the lexicon are looked at. evidence_batch() / analyze_batch() run the
+    automaton over many texts at once. The other ENGINES are kept as
+    references for the benchmark (bench/stages.py).
+    """
+    def __init__(self, lexicon_path=LEXICON_PATH, patterns_path=PATTERNS_PATH):
+        with open(lexicon_path, 'r', encoding='utf-8') as f:
+            self.lexicon = json.load(f)['words']
+        with open(patterns_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.patterns = data['patterns']
+        self.modifiers = data['modifiers']
+        self.negations = frozenset(data['negations'])
+
+        self.compiled = [re.compile(p['pattern'], re.IGNORECASE) for p in self.patterns]
+        self.combined = re.compile('|'.join(f"(?:{p['pattern']})" for p in self.patterns), re.IGNORECASE)
+
+        # Automaton keys: whole-token words, and pattern prefixes (text is lowercased first)
+        keys = {}
+        for word in [*self.lexicon, *self.negations, *self.modifiers]:
+            if word and set(word) <= LETTERS:
+                keys.setdefault(word, [True, []])
+        self.unanchored = []  # patterns without a literal prefix, searched on their own
+        for i, pattern in enumerate(self.patterns):
+            prefixes = literal_prefixes(pattern['pattern'].lower())
+            if not prefixes:
+                self.unanchored.append(i)
+            for prefix in prefixes:
+                keys.setdefault(prefix, [False, []])[1].append(i)
+        self.automaton = AhoCorasick(keys)
+        self._is_word = [is_word for is_word, _ in keys.values()]
+        self._anchored = [patterns for _, patterns in keys.values()]
+
+    # ============= MATCHING =============
+
+    def pattern_matches(self, text, engine='automaton'):
+        """
+        (pattern_index, match) for every match the frontend's
+        `while (regex.exec(text))` loops find, in pattern order.
+        """
+        if engine == 'naive':
+            return self._pattern_matches_naive(text)
+        if engine == 'alternation':
+            return self._pattern_matches_alternation(text)
+        return self._scan(text, self.automaton.find(text))[0]
+
+    def _pattern_matches_naive(self, text):
+        return [(i, match) for i, regex in enumerate(self.compiled) for match in _exec_all(regex, text)]
+
+    def _pattern_matches_alternation(self, text):
+        # One scan finds each position where some pattern matches; only
+        # there are the individual patterns tried
+        found = []
+        next_start = [0] * len(self.compiled)  # each pattern's lastIndex
+        position = 0
+        while True:
+            hit = self.combined.search(text, position)
+            if hit is None:
+                break
+            start = hit.start()
+            for i, regex in enumerate(self.compiled):
+                if next_start[i] > start:
+                    continue
+                match = regex.match(text, start)
+                if match is not None:
+                    found.append((i, match))
+                    next_start[i] = max(match.end(), start + 1)
+            position = start + 1
+        found.sort(key=lambda item: (item[0], item[1].start()))
+        return found
+
+    def _word_hits_naive(self, text):
+        """(word, previous token, token before it) of every lexicon token"""
+        tokens = TOKEN_RE.findall(text)
+        return [
+            (word, tokens[i - 1] if i > 0 else None, tokens[i - 2] if i > 1 else None)
+            for i, word in enumerate(tokens) if word in self.lexicon
+        ]
+
+    def _scan(self, text, hits):
+        """Pattern matches and lexicon word hits of a lowercased text from its automaton hits"""
+        # Hits come by end position. Whole tokens don't overlap and the
+        # prefixes of one pattern all have the same length, so that is also
+        # start order for both
+        candidates = {}
+        tokens = []  # (start, end, word) of known whole tokens
+        anchored, is_word, lengths, keys = self._anchored, self._is_word, self.automaton.lengths, self.automaton.keys
+        size = len(text)
+        for start, key_id in hits:
+            if is_word[key_id]:
+                end = start + lengths[key_id]
+                if (start == 0 or text[start - 1] not in LETTERS) and (end == size or text[end] not in LETTERS):
+                    tokens.append((start, end, keys[key_id]))
+            for i in anchored[key_id]:
+                candidates.setdefault(i, []).append(start)
+
+        found = []
+        for i in sorted(candidates.keys() | set(self.unanchored)) if self.unanchored else sorted(candidates):
+            regex = self.compiled[i]
+            if i not in candidates:
+                found.extend((i, match) for match in _exec_all(regex, text))
+                continue
+            next_start = 0
+            for start in candidates[i]:
+                if start < next_start:
+                    continue
+                match = regex.match(text, start)
+                if match is not None:
+                    found.append((i, match))
+                    next_start = max(match.end(), start + 1)
+
+        # The previous token only matters when it is a known word right before this one
+        words = []
+        for j, (start, end, word) in enumerate(tokens):
+            if word not in self.lexicon:
+                continue
+            previous = before = None
+            if j > 0 and not _LETTER_RE.search(text, tokens[j - 1][1], start):
+                previous = tokens[j - 1][2]
+                if j > 1 and not _LETTER_RE.search(text, tokens[j - 2][1], tokens[j - 1][0]):
+                    before = tokens[j - 2][2]
+            words.append((word, previous, before))
+        return found, words
+
+    # ============= SCORING =============
+
+    def evidence(self, text, engine='automaton'):
+        """
+        Raw analysis of one text: (score, emotion counts, detected patterns,
+        (word, score, negated) keywords, alert). See analyze() for the summary.
+        Patterns and words are marked 'negated' when a negation comes right
+        before them; the frontend scores those patterns as if it didn't.
+        """
+        lower = text.lower()
+        if engine == 'automaton':
+            return self._score(*self._scan(lower, self.automaton.find(lower)))
+        return self._score(self.pattern_matches(lower, engine), self._word_hits_naive(lower))
+
+    def evidence_batch(self, texts):
+        """evidence() of many texts, matched together by the automaton"""
+        lowers = [text.lower() for text in texts]
+        return [
+            self._score(*self._scan(lower, hits))
+            for lower, hits in zip(lowers, self.automaton.find_batch(lowers))
+        ]
+
+    def _negated(self, match):
+        """Whether one of the NEGATION_WINDOW tokens before a pattern match is a negation"""
+        start = match.start()
+        before = TOKEN_RE.findall(match.string, max(start - 32, 0), start)[-NEGATION_WINDOW:]
+        return any(token in self.negations for token in before)
+
+    def _score(self, pattern_matches, word_hits):
+        score = 0.0
+        emotions = {}
+        patterns = []
+        alert = False
+
+        for i, match in pattern_matches:
+            definition = self.patterns[i]
+            if definition['type'] == 'phrase':
+                score += definition['score'] * 2  # Weight patterns higher
+                patterns.append({'phrase': match.group(0), 'emotion': definition['emotion'],
+                                 'score': definition['score'], 'negated': self._negated(match)})
+                emotions[definition['emotion']] = emotions.get(definition['emotion'], 0) + 3
+                alert = alert or bool(definition.get('alert'))
+            elif definition['type'] in ('direct_emotion', 'direct_state'):
+                intensity = match.group(1).strip() if match.group(1) else None
+                entry = self.lexicon.get(match.group(2))
+                if entry is None:
+                    continue
+                multiplier = self.modifiers.get(intensity, 1) if intensity else 1
+                score += entry['score'] * multiplier * 2
+                for emotion in entry['emotions']:
+                    emotions[emotion] = emotions.get(emotion, 0) + 3
+                patterns.append({'phrase': match.group(0), 'emotion': entry['emotions'][0],
+                                 'score': entry['score'] * multiplier, 'negated': self._negated(match)})
+
+        words = []
+        for word, previous, before in word_hits:
+            entry = self.lexicon[word]
+            multiplier = 1
+            if previous is not None:
+                if previous in self.negations:
+                    multiplier *= -1
+                if previous in self.modifiers:
+                    multiplier *= self.modifiers[previous]
+                # "no muy bueno"
+                if before in self.negations and previous in self.modifiers:
+                    multiplier *= -1
+            word_score = entry['score'] * multiplier
+            score += word_score
+            negated = previous in self.negations or (before in self.negations and previous in self.modifiers)
+            words.append((word, word_score, negated))
+            # Negated words add to the score but not to the emotions
+            if multiplier > 0:
+                for emotion in entry['emotions']:
+                    emotions[emotion] = emotions.get(emotion, 0) + 1
+
+        return score, emotions, patterns, words, alert
+
+    def analyze(self, text, engine='automaton'):
+        """Same result as analyzeSentimentAdvanced(text) in the frontend"""
+        if not text:
+            return None
+        return self._summary(*self.evidence(text, engine))
+
+    def analyze_batch(self, texts):
+        """analyze() of many texts, matched together by the automaton"""
+        return [
+            self._summary(*evidence) if text else None
+            for text, evidence in zip(texts, self.evidence_batch(texts))
+        ]
+
+    def _summary(self, score, emotions, patterns, words, alert):
+        normalized = max(-100, min(100, score * 5))
+        total = sum(emotions.values())
+        percentages = {emotion: _js_round(count / total * 100) for emotion, count in emotions.items()} if total else {}
+
+        classification = 'Neutral'
+        if normalized > 5:
+            classification = 'Positivo'
+        if normalized < -5:
+            classification = 'Negativo'
+
+        explanation = f"Análisis avanzado: Se detectaron {len(patterns)} patrones y {len(words)} palabras clave."
+        if alert:
+            explanation += " ⚠️ SE DETECTARON SEÑALES DE ALERTA."
+
+        confidence = 0.5
+        if patterns:
+            confidence += 0.2
+        confidence += abs(normalized) / 100 * 0.3
+        confidence = max(0, min(1, confidence))
+
+        magnitude = abs(normalized)
+        return {
+            'classification': classification,
+            'score': _js_round(normalized),
+            'emotions': percentages,
+            'intensity': 'Alta' if magnitude > 70 else 'Media' if magnitude > 30 else 'Baja',
+            'keywords': [p['phrase'] for p in patterns] + [word for word, _, _ in words],
+            'explanation': explanation,
+            'isAlert': alert,
+            'confidence': confidence,
+            'source': 'rules',
+        }
+
+    def class_distribution(self, emotions, labels):
+        """
+        Share of the CLASS_EMOTIONS evidence in `emotions` (counts) for each
+        label, in the order of `labels`, plus the evidence total.
+        """
+        counts = [sum(emotions.get(emotion, 0) for emotion in CLASS_EMOTIONS.get(label, ())) for label in labels]
+        total = sum(counts)
+        return [count / total if total else 0.0 for count in counts], total
+
+class LexiconCascade:
+    """
+    Confidence gate in front of the text model: texts whose lexicon and
+    pattern evidence is strong (at least min_evidence points, where a
+    pattern counts 3 and a word 1) and points to one class (at least
+    min_share of it) are answered from the rules; the rest go to the model.
+    So do texts with a negated pattern or word ("no me siento feliz"), which
+    the rules misread, and texts whose rule score has the other polarity
+    than the class (CLASS_POLARITY).
+    Counts the decisions, one per text (a /predict_batch request decides
+    each of its texts), so the fraction of skipped forward passes can be
+    reported; the counters are locked, as batches are decided on executor threads.
+    """
+    def __init__(self, analyzer, labels, min_evidence=3, min_share=0.8):
+        self.analyzer = analyzer
+        self.labels = list(labels)
+        self.min_evidence = min_evidence
+        self.min_share = min_share
+        self.texts = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def decide(self, text):
+        """
+        (share of the rule evidence per label, evidence points), or None when
+        the model has to decide. The shares are not model probabilities.
+        """
+        return self._decide(self.analyzer.evidence(text))
+
+    def decide_batch(self, texts):
+        """decide() for many texts, matched together by the automaton"""
+        return [self._decide(evidence) for evidence in self.analyzer.evidence_batch(texts)]
+
+    def _decide(self, evidence):
+        decision = self._gate(evidence)
+        with self._lock:
+            self.texts += 1
+            self.skipped += decision is not None
+        return decision
+
+    def _gate(self, evidence):
+        score, emotions, patterns, words, _ = evidence
+        distribution, total = self.analyzer.class_distribution(emotions, self.labels)
+        if total < self.min_evidence or max(distribution) < self.min_share:
+            return None
+        if any(pattern['negated'] for pattern in patterns) or any(negated for _, _, negated in words):
+            return None
+        label = self.labels[distribution.index(max(distribution))]
+        if score * CLASS_POLARITY.get(label, 0) <= 0:
+            return None
+        return distribution, total
+
+    def stats(self):
+        with self._lock:
+            texts, skipped = self.texts, self.skipped
+        return {
+            'texts': texts,
+            'skipped': skipped,
+            'skip_fraction': skipped / texts if texts else 0.0,
+            'min_evidence': self.min_evidence,
+            'min_share': self.min_share,
+        }
@@ -0,0 +1,132 @@
+import io
+import os
+import sys
+import time
+import asyncio
+import zipfile
+import tempfile
+import threading
+from collections import Counter
+
+class StackSampler:
+    """
+    Python sampling profiler: a background thread records the stack of every
+    other thread (sys._current_frames) every `interval` seconds and keeps
+    counts per distinct stack, in the collapsed format flamegraph.pl and
+    speedscope read ("thread;outer;...;inner count").
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class ProfileCapture:
+    """
+    One on-demand capture: the stack sampler plus, when torch is in use,
+    torch.profiler recording CPU operators on every thread. Nothing is
+    installed until start(), and everything is removed by stop().
+    """
+    def __init__(self, profile_torch=True, interval=0.005):
+        self.sampler = StackSampler(interval)
+        self.profile_torch = profile_torch
+        self.requests = 0
+        self.target_requests = 0
+        self._profiler = None
+        self._done = None
+        self._started = None
+        self.duration = 0.0
+
+    def start(self):
+        self._done = asyncio.Event()
+        self._started = time.perf_counter()
+        if self.profile_torch:
+            self._profiler = _torch_profiler()
+            self._profiler.__enter__()
+        self.sampler.start()
+
+    def request_done(self):
+        """Called by the server for every completed request while active"""
+        self.requests += 1
+        if self.target_requests and self.requests >= self.target_requests:
+            self._done.set()
+
+    async def wait(self, seconds, requests=0):
+        """Run for `seconds`, or until `requests` requests completed if sooner"""
+        self.target_requests = requests
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def stop(self):
+        self.sampler.stop()
+        if self._profiler is not None:
+            self._profiler.__exit__(None, None, None)
+        self.duration = time.perf_counter() - self._started
+
+    def archive(self):
+        """Zip with trace.json (Chrome trace), stacks.collapsed and summary.txt"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('stacks.collapsed', self.sampler.collapsed())
+
+            summary = [
+                f"duration_s: {self.duration:.3f}",
+                f"requests: {self.requests}",
+                f"python_samples: {self.sampler.samples} (every {self.sampler.interval * 1000:g} ms)",
+            ]
+            if self._profiler is not None:
+                with tempfile.TemporaryDirectory() as tmp:
+                    trace_path = os.path.join(tmp, 'trace.json')
+                    self._profiler.export_chrome_trace(trace_path)
+                    archive.write(trace_path, 'trace.json')
+                summary.append('')
+                summary.append(self._profiler.key_averages().table(sort_by='self_cpu_time_total', row_limit=30))
+            archive.writestr('summary.txt', '\n'.join(summary) + '\n')
+        return buffer.getvalue()
+
+def _torch_profiler():
+    import torch
+    from torch.profiler import profile, ProfilerActivity
+
+    kwargs = {'activities': [ProfilerActivity.CPU], 'record_shapes': True}
+    try:
+        # Inference runs on pool threads; by default only this thread is recorded
+        kwargs['experimental_config'] = torch._C._profiler._ExperimentalConfig(profile_all_threads=True)
+    except (AttributeError, TypeError):
+        pass
+    return profile(**kwargs)
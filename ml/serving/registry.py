@@ -0,0 +1,155 @@
+import time
+import asyncio
+import itertools
+
+from serving.cache import artifact_fingerprint
+
+_versions = itertools.count(1)
+
+class ModelEntry:
+    """
+    One loaded version of a model: its backend plus everything tied to its
+    weights (the prediction cache). Entries are never modified; a reload
+    builds a new one.
+    """
+    def __init__(self, name, backend, fingerprint, cache=None, load_seconds=0.0):
+        self.name = name
+        self.backend = backend
+        self.fingerprint = fingerprint
+        self.cache = cache
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.version = next(_versions)
+
+    def close(self):
+        """Release the cache once a newer version has replaced this one"""
+        if self.cache is not None and hasattr(self.cache, 'close'):
+            self.cache.close()
+
+    def status(self):
+        return {
+            'version': self.version,
+            'backend': self.backend.name,
+            'path': str(self.backend.model_path),
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 3),
+        }
+
+class ModelRegistry:
+    """
+    Models served side by side under a name ('cnn', 'lstm', ...).
+
+    load_fn(name, path) -> ModelEntry loads, warms up and returns a new
+    entry; it runs in a worker thread. watch() polls the artifact of every
+    name (artifact_fn(name) -> path) and, when a file appears or changes,
+    loads the new version in the background and then replaces the entry
+    in one assignment. Requests that already got the old entry finish on
+    it; later get() calls return the new one. A version that fails to load
+    is reported and skipped, and the previous one keeps serving.
+    """
+    def __init__(self, names, artifact_fn, load_fn, on_swap=None):
+        self.names = list(names)
+        self.artifact_fn = artifact_fn
+        self.load_fn = load_fn
+        self.on_swap = on_swap
+        self._entries = {}
+        self._failed = {}  # name -> fingerprint that failed to load
+        self._loading = set()
+        self._task = None
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def get(self, name):
+        """Current entry of a model; KeyError if it isn't loaded"""
+        return self._entries[name]
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def _fingerprint(self, name):
+        path = self.artifact_fn(name)
+        try:
+            return path, artifact_fingerprint(path)
+        except FileNotFoundError:
+            return path, None
+
+    def _load(self, name, path, fingerprint):
+        start = time.perf_counter()
+        entry = self.load_fn(name, path)
+        entry.fingerprint = fingerprint
+        entry.load_seconds = time.perf_counter() - start
+        return entry
+
+    def _install(self, entry):
+        previous = self._entries.get(entry.name)
+        self._entries[entry.name] = entry
+        self._failed.pop(entry.name, None)
+        if self.on_swap is not None:
+            self.on_swap(entry, previous)
+        if previous is not None:
+            previous.close()
+
+    def load_all(self):
+        """Load every model whose artifact exists (blocking, for startup)"""
+        for name in self.names:
+            path, fingerprint = self._fingerprint(name)
+            if fingerprint is None:
+                print(f"⚠ {name}: {path} not found, will load it when it appears")
+                continue
+            self._install(self._load(name, path, fingerprint))
+
+    async def reload(self, name):
+        """Load the artifact of `name` in a thread and swap it in; returns the new entry or None"""
+        path, fingerprint = self._fingerprint(name)
+        if fingerprint is None or name in self._loading:
+            return None
+        self._loading.add(name)
+        try:
+            entry = await asyncio.to_thread(self._load, name, path, fingerprint)
+        except Exception as e:
+            self._failed[name] = fingerprint
+            print(f"✗ {name}: failed to load {path}, keeping the current version: {e}")
+            return None
+        finally:
+            self._loading.discard(name)
+        self._install(entry)
+        print(f"✓ {name}: swapped in version {entry.version} from {path} ({entry.load_seconds:.2f}s)")
+        return entry
+
+    def changed(self):
+        """Names whose artifact appeared or changed since it was loaded (or last failed)"""
+        changed = []
+        for name in self.names:
+            _, fingerprint = self._fingerprint(name)
+            if fingerprint is None or fingerprint == self._failed.get(name):
+                continue
+            entry = self._entries.get(name)
+            if entry is None or entry.fingerprint != fingerprint:
+                changed.append(name)
+        return changed
+
+    async def watch(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            for name in self.changed():
+                await self.reload(name)
+
+    def start(self, interval):
+        """Start polling the artifacts every `interval` seconds"""
+        self._task = asyncio.get_running_loop().create_task(self.watch(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self):
+        return {
+            name: self._entries[name].status() if name in self._entries else None
+            for name in self.names
+        }